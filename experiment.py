@@ -0,0 +1,50 @@
+import logging
+import traceback
+
+from settings import DATASET_PATH, TAXO_TREE_PATH, IGNORE_CHECK, LOG_LEVEL, \
+    LOG_FILE, SEED, EXPERIMENT_REPORT_PATH, EXPERIMENT_EDPS, \
+    EXPERIMENT_STEPS, EXPERIMENT_RUNS, EXPERIMENT_WORKERS
+from src.exceptions import BaseException
+from src.experiment import run_experiments, summarize_results
+from src.file_handler import import_dataset, import_taxonomy_tree, \
+    export_dataset, get_taxonomy_schema
+from src.validator import check_valid_input_data
+
+
+if __name__ == "__main__":
+    try:
+        logging.basicConfig(filename=LOG_FILE, filemode='w',level=LOG_LEVEL)
+        # Import and check once for all repetitions
+        print("Importing dataset...")
+        taxo_tree = import_taxonomy_tree(TAXO_TREE_PATH)
+        dataset = import_dataset(
+            DATASET_PATH, get_taxonomy_schema(taxo_tree)
+            )
+        if not IGNORE_CHECK:
+            check_valid_input_data(taxo_tree, dataset)
+        print("Running {} repetitions of {} settings...".format(
+            EXPERIMENT_RUNS, len(EXPERIMENT_EDPS) * len(EXPERIMENT_STEPS)
+            ))
+        results = run_experiments(
+            dataset, taxo_tree, EXPERIMENT_EDPS, EXPERIMENT_STEPS,
+            EXPERIMENT_RUNS, SEED, EXPERIMENT_WORKERS
+            )
+        summary = summarize_results(results)
+        export_dataset(EXPERIMENT_REPORT_PATH, summary)
+        for row in summary:
+            print(
+                "EDP {edp}, STEPS {steps}: CA {mean:.4f} "
+                "[{low:.4f}, {high:.4f}]".format(
+                    edp=row["edp"],
+                    steps=row["steps"],
+                    mean=row["classification_accuracy_mean"],
+                    low=row["classification_accuracy_ci_low"],
+                    high=row["classification_accuracy_ci_high"]
+                    )
+                )
+        print("Report exported to {}".format(EXPERIMENT_REPORT_PATH))
+    except BaseException as e:
+        print("{} - {}".format(e.code, e.detail))
+    except:
+        print("Uncatched exception")
+        traceback.print_exc()
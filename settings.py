@@ -1,19 +1,23 @@
 IGNORE_CHECK = False    # Only ignore if input data is ensured to be valid
+VALIDATION_WORKERS = 1  # Threads checking the attributes of input data
 
 # Logging
 import logging
 LOG_LEVEL = logging.INFO
 LOG_FILE = "logger/logging.txt"
-LOG_NOISE_LEN = 32
 LOG_NOISE_ROW = 5
 
 # File paths
 DATASET_PATH = "data/ds/adult-full.csv"
 TAXO_TREE_PATH = "data/taxos/adult-full.json"
+DATASET_CACHE_DIR = "data/cache"    # Binary copies of datasets, None for off
+TAXO_INDEX_CACHE = True # Cache compiled taxonomy trees next to their files
+SPARSE_EXPORT = True    # Non-zero counts only, for anonymized .npz datasets
 TRAIN_PATH = "data/export/adult-train.csv"
 TEST_PATH = "data/export/adult-test.csv"
 COVERED_TRAIN_PATH = "data/export/covered-adult-train.csv"
 COVERED_TEST_PATH = "data/export/covered-adult-test.csv"
+EXPERIMENT_REPORT_PATH = "data/export/experiment-report.csv"
 
 MATRIX_PATH = "data/export/org-matrix.csv"
 COVERED_MATRIX_PATH = "data/export/covered-matrix.csv"
@@ -23,6 +27,7 @@ CLASS_ATTRIBUTE = "class"
 CLASS_COUNTER = "class_counter"
 MISSING_VALUE = "?"
 TRAIN_DATA_SIZE = 0.8
+CHUNK_SIZE = 100000  # Rows per chunk when streaming a dataset
 
 # Taxonomy tree setting
 TAXO_FROM = "min"
@@ -37,6 +42,7 @@ UTILITY_FUNCTION = information_gain
 DIGIT = 0   # Rounding
 EDP = 0.1
 STEPS = 16
+SEED = None # Seed of the random generator, None for a fresh one
 
 # Matrix release setting
 SAMPLES = 2000
@@ -49,3 +55,12 @@ MIN_ENSURE = 0.85
 
 # classification setting
 PRUNING_RATE = 0.8
+C45_WORKERS = 1 # Processes growing the decision tree, 1 for no process pool
+C45_PARALLEL_SIZE = 20000   # Rows of a batch of subtrees sent to the pool
+
+# Experiment setting
+EXPERIMENT_EDPS = [0.1, 0.5, 1.0]
+EXPERIMENT_STEPS = [4, 8, 16]
+EXPERIMENT_RUNS = 10    # Repetitions of each (EDP, STEPS) pair
+EXPERIMENT_WORKERS = 4  # Processes running the repetitions
+EXPERIMENT_CONFIDENCE = 0.95    # Level of the confidence intervals
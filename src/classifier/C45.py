@@ -1,8 +1,16 @@
 import logging
+import numpy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.util import Finalize
 from typing import List
 
-from settings import CLASS_ATTRIBUTE, CLASS_COUNTER, PRUNING_RATE
-from src.utility import RecordCounter, information_gain
+from settings import CLASS_COUNTER, PRUNING_RATE, C45_WORKERS, \
+    C45_PARALLEL_SIZE
+from src.dataset import ColumnarDataset, CountTable
+from src.utility import batch_information_gain, count_histogram, \
+    group_rows, prefix_split_counts
 
 
 class DecisionNode:
@@ -11,219 +19,433 @@ class DecisionNode:
         self.split_value = split_value
         self.attr_value = attr_value
         self.decision = decision
+        self.majority = decision
         self.children = []
 
 
 class C45:
-    def __init__(self, dataset:List[dict]):
-        self.data = dataset
-        self.attributes = list(dataset[0].keys())
-        self.attributes.remove(CLASS_ATTRIBUTE)
-        self.attributes.remove(CLASS_COUNTER)
+    def __init__(self, dataset:CountTable):
+        # Training data is kept as columns of items, each with the count of
+        # every class. A tree node only holds the indexes of its items
+        if not isinstance(dataset, CountTable):
+            weights = None
+            if isinstance(dataset, list):
+                if CLASS_COUNTER in dataset[0]:
+                    weights = numpy.array(
+                        [item[CLASS_COUNTER] for item in dataset],
+                        dtype=float
+                        )
+                dataset = ColumnarDataset.from_dicts([
+                    {
+                        att: value for att, value in item.items()
+                        if att != CLASS_COUNTER
+                        }
+                    for item in dataset
+                    ])
+            dataset = CountTable.from_dataset(dataset, weights)
+        # Items without any record do not count
+        non_empty = numpy.flatnonzero(dataset.counts.sum(axis=1) > 0)
+        columnar = dataset.dataset.take(non_empty)
+        self.class_counts = dataset.counts[non_empty].astype(float)
+        self.class_list = list(dataset.class_list)
+        self.attributes = columnar.get_attributes()
+        self.columns = {
+            attribute: columnar.get_column(attribute)
+            for attribute in self.attributes
+            }
+        # Empty for float attributes
         self.attr_values = {
-            attribute: set()
+            attribute: [] if columnar.is_float_attribute(attribute) \
+                else columnar.get_categories(attribute)
             for attribute in self.attributes
-        }
+            }
+        self.row_cnt = len(self.class_counts)
         self.tree = None
-        self.counter = None
-        for row in dataset:
-            for key, value in row.items():
-                if not isinstance(value, float) and key != CLASS_ATTRIBUTE \
-                        and key != CLASS_COUNTER:
-                    self.attr_values[key].add(value)
-        for attr in self.attributes:
-            self.attr_values[attr] = list(self.attr_values[attr])
-
-    def generate_decision_tree(self):
-        self.tree = self.recursive_generate_tree(
-            self.data, 
-            self.attributes, 
-            None,
-            get_most_frequent_decision(self.data)
+        # Flattened tree, node 0 is the root. Childs of a node are
+        # consecutive from node_child_from: one per category value, or
+        # (<= split value, > split value) for float attributes
+        self.node_attribute = None
+        self.node_split_value = None
+        self.node_child_from = None
+        self.node_class = None
+
+    def generate_decision_tree(self, workers:int=C45_WORKERS):
+        rows = numpy.arange(self.row_cnt)
+        most_frequent_decision = self.get_most_frequent_decision(rows)
+        if workers > 1 and self.row_cnt >= 2 * C45_PARALLEL_SIZE:
+            self.tree = self.grow_tree_parallel(
+                rows, most_frequent_decision, workers
+                )
+        else:
+            self.tree = self.grow_tree(
+                rows, self.attributes, None, most_frequent_decision
+                )
+        self.compile_tree()
+
+    def grow_tree(
+        self, rows, cur_attributes, cur_attr_value, most_frequent_decision,
+        deferred:list=None, max_size:int=0
+        ) -> DecisionNode:
+        # Breadth-first with a queue of tasks (rows, attributes, attribute
+        # value, parent's most frequent decision, parent node). If deferred
+        # is given, tasks of at most max_size rows are not grown but added
+        # to it as (parent node, child index, task)
+        holder = DecisionNode(None, None, None, None)
+        tasks = deque([(
+            rows, cur_attributes, cur_attr_value, most_frequent_decision,
+            holder
+            )])
+        while tasks:
+            task = tasks.popleft()
+            parent = task[-1]
+            if deferred is not None and len(task[0]) <= max_size:
+                deferred.append((parent, len(parent.children), task[:-1]))
+                parent.children.append(None)
+                continue
+            node, child_tasks = self.generate_node(*task[:-1])
+            parent.children.append(node)
+            tasks.extend(child_task + (node,) for child_task in child_tasks)
+        return holder.children[0]
+
+    def grow_tree_parallel(self, rows, most_frequent_decision, workers:int) \
+        -> DecisionNode:
+        # Nodes are split here until the subtrees are small enough to
+        # balance the work, the subtrees are then grown in the pool in
+        # batches of at least C45_PARALLEL_SIZE rows. The columns are
+        # shared with the processes, not pickled
+        shared = []
+        arrays = {"class_counts": self.class_counts}
+        arrays.update(
+            ("column:{att}".format(att=att), column)
+            for att, column in self.columns.items()
             )
+        try:
+            array_specs = {}
+            for key, arr in arrays.items():
+                shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+                shared.append(shm)
+                numpy.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[:] = arr
+                array_specs[key] = (shm.name, arr.shape, arr.dtype.str)
+            with ProcessPoolExecutor(
+                workers,
+                initializer=init_worker,
+                initargs=(
+                    self.attributes, self.attr_values, self.class_list,
+                    array_specs
+                    )
+                ) as pool:
+                deferred = []
+                tree = self.grow_tree(
+                    rows, self.attributes, None, most_frequent_decision,
+                    deferred, self.row_cnt // (4 * workers)
+                    )
+                deferred.sort(key=lambda item: -len(item[2][0]))
+                batches = [[]]
+                batch_size = 0
+                for item in deferred:
+                    if batch_size >= C45_PARALLEL_SIZE:
+                        batches.append([])
+                        batch_size = 0
+                    batches[-1].append(item)
+                    batch_size += len(item[2][0])
+                results = pool.map(
+                    grow_flattened_subtrees,
+                    [[task for _, _, task in batch] for batch in batches]
+                    )
+                for batch, flattened_trees in zip(batches, results):
+                    for (parent, index, _), flattened \
+                        in zip(batch, flattened_trees):
+                        parent.children[index] = unflatten_tree(flattened)
+            return tree
+        finally:
+            for shm in shared:
+                shm.close()
+                shm.unlink()
+
+    def compile_tree(self):
+        nodes = [self.tree]
+        child_from = []
+        index = 0
+        while index < len(nodes):   # Breadth-first
+            child_from.append(len(nodes))
+            nodes.extend(nodes[index].children)
+            index += 1
+        class_codes = {cls: code for code, cls in enumerate(self.class_list)}
+        attribute_codes = {
+            attribute: code
+            for code, attribute in enumerate(self.attributes)
+            }
+        self.node_attribute = numpy.array([
+            attribute_codes[node.attribute] if node.children else -1
+            for node in nodes
+            ], dtype=numpy.intp)
+        self.node_split_value = numpy.array([
+            numpy.nan if node.split_value is None else node.split_value
+            for node in nodes
+            ], dtype=float)
+        self.node_child_from = numpy.array(child_from, dtype=numpy.intp)
+        # Decision of leafs, most frequent decision of other nodes
+        self.node_class = numpy.array(
+            [class_codes[node.majority] for node in nodes], dtype=numpy.intp
+            )
+
+    def count_classes(self, rows:numpy.ndarray) -> numpy.ndarray:
+        return self.class_counts[rows].sum(axis=0)
 
-    def find_split_attribute(self, cur_dataset, cur_attributes):
+    def find_split_attribute(self, rows, cur_attributes):
         selected_attr = None
         best_infogain = -float("inf")
         best_split_value = None
-        split_data = []
         for attribute in cur_attributes:
             if not self.attr_values[attribute]:
                 # float attribute
-                cur_dataset = sorted(cur_dataset, key=lambda k: k[attribute])
-                counter = RecordCounter()
-                for item in cur_dataset:
-                    counter.record(item[CLASS_ATTRIBUTE], item[CLASS_COUNTER])
-                less_equal_counter = RecordCounter(list(counter.count.keys()))
-                index = 0
-                while index < len(cur_dataset)-1:
-                    split_value = cur_dataset[index][attribute]
-                    while index < len(cur_dataset) \
-                        and cur_dataset[index][attribute] == split_value:
-                        less_equal_counter.record(
-                            cur_dataset[index][CLASS_ATTRIBUTE],
-                            cur_dataset[index][CLASS_COUNTER]
-                            )
-                        index += 1
-                    if index < len(cur_dataset):
-                        greater_counter = counter - less_equal_counter
-                        infogain_attr = information_gain(
-                            counter, 
-                            {
-                                'left': less_equal_counter, 
-                                'right': greater_counter
-                            }
-                        )
-                        if infogain_attr > best_infogain:
-                            best_infogain = infogain_attr
-                            selected_attr = attribute
-                            best_split_value = split_value
-                less_equal = []
-                greater = []
-                if selected_attr == attribute:
-                    for item in cur_dataset:
-                        if item[attribute] <= best_split_value:
-                            less_equal.append(item)
-                        else:
-                            greater.append(item)
-                    split_data = [less_equal, greater]
+                infogain_attr, split_value = self.calculate_numeric_infogain(
+                    rows, attribute
+                    )
             else:
                 # category attribute
-                infogain_attr, sub_data = self.calculate_infogain(
-                    cur_dataset, attribute
-                    )
-                if infogain_attr > best_infogain:
-                    selected_attr = attribute
-                    best_infogain = infogain_attr
-                    split_data = sub_data
-                    best_split_value = None
-        return selected_attr, split_data, best_split_value
-
-    def recursive_generate_tree(
-        self, cur_dataset, cur_attributes, cur_attr_value, 
-        most_frequent_decision
+                infogain_attr = self.calculate_infogain(rows, attribute)
+                split_value = None
+            if infogain_attr > best_infogain:
+                best_infogain = infogain_attr
+                selected_attr = attribute
+                best_split_value = split_value
+        return (
+            selected_attr,
+            self.split_rows(rows, selected_attr, best_split_value),
+            best_split_value
+            )
+
+    def split_rows(self, rows, attribute, split_value) -> List[numpy.ndarray]:
+        column = self.columns[attribute][rows]
+        if split_value is None:
+            # One part for each value of the category attribute
+            return group_rows(
+                rows, column, len(self.attr_values[attribute])
+                )
+        return group_rows(rows, (column > split_value).astype(numpy.intp), 2)
+
+    def generate_node(
+        self, rows, cur_attributes, cur_attr_value, most_frequent_decision
         ):
+        # Node of the rows and tasks of its childs
         # current data is empty, return previous most frequent decision
-        if len(cur_dataset) == 0:
+        if len(rows) == 0:
             logging.info("Append decision ~: %s", most_frequent_decision)
             return DecisionNode(
                 None, None, cur_attr_value, most_frequent_decision
-                )
+                ), []
         # update most frequent decision
-        most_frequent_decision = get_most_frequent_decision(cur_dataset)
-        # current attributes is empty or all current attributes have the same values for all records
-        # in current data, return current most frequent decision
+        most_frequent_decision = self.get_most_frequent_decision(rows)
+        # current attributes is empty or all current attributes have the
+        # same values for all records in current data, return current most
+        # frequent decision
         if len(cur_attributes) == 0 \
-            or same_attribute_values(cur_dataset, cur_attributes):
+            or self.same_attribute_values(rows, cur_attributes):
             logging.info("Append decision: %s", most_frequent_decision)
             return DecisionNode(
                 None, None, cur_attr_value, most_frequent_decision
-                )
-        decision = check_decision(cur_dataset)
+                ), []
+        decision = self.check_decision(rows)
         if decision:
             logging.info("Found decision: %s", decision)
-            return DecisionNode(None, None, cur_attr_value, decision)
+            return DecisionNode(None, None, cur_attr_value, decision), []
         split_attribute, split_data, split_value = self.find_split_attribute(
-            cur_dataset, cur_attributes
+            rows, cur_attributes
             )
         logging.info(
-            "Split attribute: %s, split_value: %s", 
+            "Split attribute: %s, split_value: %s",
             split_attribute, split_value
             )
         new_attributes = cur_attributes[:]
         node = DecisionNode(split_attribute, split_value, cur_attr_value, None)
+        node.majority = most_frequent_decision
         if split_value is None:
             new_attributes.remove(split_attribute)
-            node.children = [
-                self.recursive_generate_tree(
-                    sub_data, 
-                    new_attributes,
-                    self.attr_values[split_attribute][index],
-                    most_frequent_decision
-                    )
-                for index, sub_data in enumerate(split_data)
-                ]
+            child_values = self.attr_values[split_attribute]
         else:
-            if same_numeric_attribute_value(cur_dataset, split_attribute):
+            if self.same_attribute_values(rows, [split_attribute]):
                 new_attributes.remove(split_attribute)
-            node.children = [
-                self.recursive_generate_tree(
-                    sub_data, 
-                    new_attributes,
-                    None, 
-                    most_frequent_decision
-                    )
-                for sub_data in split_data
-                ]
-        return node
-
-    def calculate_infogain(self, dataset, attribute):
-        sub_data = [[] for i in range(len(self.attr_values[attribute]))]
-        value_counter = RecordCounter()
-        child_counter = {
-            attr_value: RecordCounter()
-            for attr_value in self.attr_values[attribute]
-        }
-        for item in dataset:
-            cls = item[CLASS_ATTRIBUTE]
-            cls_count = item[CLASS_COUNTER]
-            value_counter.record(cls, cls_count)
-            child_counter[item[attribute]].record(cls, cls_count)
-            for i in range(len(self.attr_values[attribute])):
-                if item[attribute] == self.attr_values[attribute][i]:
-                    sub_data[i].append(item)
-        return information_gain(value_counter, child_counter), sub_data
+            child_values = [None, None]
+        child_tasks = [
+            (sub_rows, new_attributes, value, most_frequent_decision)
+            for sub_rows, value in zip(split_data, child_values)
+            ]
+        return node, child_tasks
 
-    def get_prediction(self, object):
-        node = self.tree
-        while not node.decision:
-            attribute = node.attribute
-            if node.split_value is None:
-                for child in node.children:
-                    if child.attr_value == object[attribute]:
-                        node = child
-                        break
-            else:
-                if object[attribute] < node.split_value:
-                    node = node.children[0]
-                else:
-                    node = node.children[1]
-        return node.decision
+    def calculate_infogain(self, rows, attribute) -> float:
+        # Group by the category codes with one bincount
+        histogram = count_histogram(
+            self.columns[attribute][rows],
+            self.class_counts[rows],
+            len(self.attr_values[attribute])
+            )
+        return batch_information_gain(
+            histogram.sum(axis=0), histogram[numpy.newaxis]
+            )[0]
 
+    def calculate_numeric_infogain(self, rows, attribute):
+        # Best information gain of splits "value <= split value", all split
+        # values are scored at once from prefix sums of class counts
+        sorted_values, value_codes = numpy.unique(
+            self.columns[attribute][rows], return_inverse=True
+            )
+        if len(sorted_values) < 2:
+            return -float("inf"), None
+        histogram = count_histogram(
+            value_codes.ravel(), self.class_counts[rows], len(sorted_values)
+            )
+        infogains = batch_information_gain(
+            histogram.sum(axis=0), prefix_split_counts(histogram)
+            )
+        best_index = int(numpy.argmax(infogains))
+        return infogains[best_index], sorted_values[best_index].item()
 
-def same_attribute_values(cur_dataset, cur_attributes):
-    first_item = cur_dataset[0]
-    for row in cur_dataset:
+    def same_attribute_values(self, rows, cur_attributes) -> bool:
         for attribute in cur_attributes:
-            if row[attribute] != first_item[attribute]:
+            column = self.columns[attribute][rows]
+            if (column != column[0]).any():
                 return False
-    return True
-
-
-def same_numeric_attribute_value(cur_dataset, attribute):
-    first_value = cur_dataset[0][attribute]
-    for row in cur_dataset:
-        if row[attribute] != first_value:
-            return False
-    return True
-
-
-def get_most_frequent_decision(dataset):
-    counter = RecordCounter()
-    for item in dataset:
-        counter.record(item[CLASS_ATTRIBUTE], item[CLASS_COUNTER])
-    most_frequent_class = counter.get_most_frequent_class()
-    return most_frequent_class
-
-
-def check_decision(dataset):
-    # check if the most frequent decision / total records >= PRUNING_RATE
-    counter = RecordCounter()
-    total_records = 0
-    for item in dataset:
-        total_records += item[CLASS_COUNTER]
-        counter.record(item[CLASS_ATTRIBUTE], item[CLASS_COUNTER])
-    for key, value in counter.count.items():
-        if value / total_records >= PRUNING_RATE:
-            return key
-    return None
+        return True
+
+    def get_most_frequent_decision(self, rows):
+        return self.class_list[int(numpy.argmax(self.count_classes(rows)))]
+
+    def check_decision(self, rows):
+        # check if the most frequent decision / total records >= PRUNING_RATE
+        counts = self.count_classes(rows)
+        total_records = counts.sum()
+        for cls, value in zip(self.class_list, counts.tolist()):
+            if value / total_records >= PRUNING_RATE:
+                return cls
+        return None
+
+    def encode_columns(self, dataset) -> List[numpy.ndarray]:
+        # Columns of the dataset in the order of self.attributes, category
+        # values are coded as in the training data (-1 if unseen)
+        if isinstance(dataset, CountTable):
+            dataset = dataset.dataset
+        elif not isinstance(dataset, ColumnarDataset):
+            dataset = ColumnarDataset.from_dicts(dataset)
+        columns = []
+        for attribute in self.attributes:
+            if not self.attr_values[attribute]:
+                columns.append(dataset.get_column(attribute))
+            else:
+                translation = dataset.translate_codes(
+                    attribute, self.attr_values[attribute]
+                    )
+                columns.append(translation[dataset.get_column(attribute)])
+        return columns
+
+    def predict_batch(self, dataset) -> numpy.ndarray:
+        class_arr = numpy.empty(len(self.class_list), dtype=object)
+        class_arr[:] = self.class_list
+        return class_arr[self.predict_codes(dataset)]
+
+    def predict_codes(self, dataset) -> numpy.ndarray:
+        # Indexes in class list of the predictions. All rows are routed down
+        # the tree together, one level at a time
+        columns = self.encode_columns(dataset)
+        row_cnt = len(columns[0]) if columns else len(dataset)
+        current_nodes = numpy.zeros(row_cnt, dtype=numpy.intp)
+        result = numpy.zeros(row_cnt, dtype=numpy.intp)
+        active = numpy.arange(row_cnt)
+        while len(active):
+            nodes = current_nodes[active]
+            attributes = self.node_attribute[nodes]
+            is_leaf = attributes < 0
+            result[active[is_leaf]] = self.node_class[nodes[is_leaf]]
+            active = active[~is_leaf]
+            nodes = nodes[~is_leaf]
+            attributes = attributes[~is_leaf]
+            next_nodes = numpy.empty(len(active), dtype=numpy.intp)
+            for attribute in numpy.unique(attributes).tolist():
+                part = attributes == attribute
+                part_nodes = nodes[part]
+                values = columns[attribute][active[part]]
+                if self.attr_values[self.attributes[attribute]]:
+                    # Unseen category values stop at the current node
+                    child_offset = values
+                else:
+                    child_offset = (
+                        values > self.node_split_value[part_nodes]
+                        ).astype(numpy.intp)
+                next_nodes[part] = numpy.where(
+                    child_offset < 0,
+                    -1,
+                    self.node_child_from[part_nodes] + child_offset
+                    )
+            unseen = next_nodes < 0
+            result[active[unseen]] = self.node_class[nodes[unseen]]
+            current_nodes[active] = next_nodes
+            active = active[~unseen]
+        return result
+
+    def get_prediction(self, object):
+        return self.predict_batch([object])[0]
+
+
+def flatten_tree(tree:DecisionNode) -> list:
+    # Breadth-first (parent index, node fields) list, it is pickled without
+    # recursion however deep the tree is
+    flattened = []
+    nodes = deque([(-1, tree)])
+    while nodes:
+        parent, node = nodes.popleft()
+        nodes.extend((len(flattened), child) for child in node.children)
+        flattened.append((
+            parent, node.attribute, node.split_value, node.attr_value,
+            node.decision, node.majority
+            ))
+    return flattened
+
+
+def unflatten_tree(flattened:list) -> DecisionNode:
+    nodes = []
+    for parent, attribute, split_value, attr_value, decision, majority \
+        in flattened:
+        node = DecisionNode(attribute, split_value, attr_value, decision)
+        node.majority = majority
+        if parent >= 0:
+            nodes[parent].children.append(node)
+        nodes.append(node)
+    return nodes[0]
+
+
+# Model of a pool process, its arrays are views of the shared memory
+worker_model = None
+worker_memory = []
+
+
+def init_worker(attributes, attr_values, class_list, array_specs):
+    global worker_model
+    arrays = {}
+    for key, (name, shape, dtype) in array_specs.items():
+        shm = SharedMemory(name=name)
+        worker_memory.append(shm)
+        arrays[key] = numpy.ndarray(shape, dtype, buffer=shm.buf)
+    model = C45.__new__(C45)
+    model.attributes = attributes
+    model.columns = {
+        att: arrays["column:{att}".format(att=att)] for att in attributes
+        }
+    model.attr_values = attr_values
+    model.class_list = class_list
+    model.class_counts = arrays["class_counts"]
+    model.row_cnt = len(model.class_counts)
+    worker_model = model
+    # Run when the pool process exits
+    Finalize(None, close_worker_memory, exitpriority=0)
+
+
+def close_worker_memory():
+    # Views of the shared memory must be released before it is closed
+    global worker_model
+    worker_model = None
+    while worker_memory:
+        worker_memory.pop().close()
+
+
+def grow_flattened_subtrees(tasks:list) -> List[list]:
+    return [flatten_tree(worker_model.grow_tree(*task)) for task in tasks]
@@ -1,70 +1,96 @@
-from typing import List
+import numpy
+from typing import Tuple
 
-from settings import CLASS_ATTRIBUTE, CLASS_COUNTER
-from src.utility import RecordCounter
+from settings import CLASS_ATTRIBUTE
+from src.dataset import ColumnarDataset, CountTable
 from .C45 import C45
 
 
-def extract_group_dataset(dataset:List[dict]) -> List[dict]:
-    attributes = list(dataset[0].keys())
-    if CLASS_ATTRIBUTE in attributes:
-        for row in dataset:
-            row[CLASS_COUNTER] = 1
+def extract_group_dataset(dataset:ColumnarDataset) -> CountTable:
+    # Items with the same attribute values are grouped into one item with
+    # the count of each class. The dataset itself is not changed
+    if isinstance(dataset, CountTable):
         return dataset
+    if not isinstance(dataset, ColumnarDataset):
+        dataset = ColumnarDataset.from_dicts(dataset)
+    attributes = dataset.get_attributes()
+    if CLASS_ATTRIBUTE in attributes:
+        return CountTable.from_dataset(dataset)
+    # Already counted, with a "class:<value>" column for each class
     class_values = []
+    class_headers = []
     append_attributes = []
     for item in attributes:
         if item.startswith(CLASS_ATTRIBUTE):
             class_values.append(item.split(':')[-1])
+            class_headers.append(item)
         else:
             append_attributes.append(item)
-    trans_data = []
-    for item in dataset:
-        item_common_part = {
-            attribute: item[attribute]
-            for attribute in append_attributes
-        }
-        for class_value in class_values:
-            cls_counter = item[CLASS_ATTRIBUTE + ':' + class_value]
-            if cls_counter > 0:
-                new_item = item_common_part.copy()
-                new_item[CLASS_ATTRIBUTE] = class_value
-                new_item[CLASS_COUNTER] = cls_counter
-                trans_data.append(new_item)
-    return trans_data
+    counts = numpy.stack(
+        [dataset.get_values(header) for header in class_headers], axis=1
+        ).astype(numpy.int64)
+    return CountTable(
+        dataset.select(append_attributes), class_values, counts
+        )
 
 
 def calculate_classification_accuracy(
-    train_dataset:List[dict], test_dataset:List[dict]
+    train_dataset:CountTable, test_dataset:CountTable
     ) -> float:
+    train_dataset = extract_group_dataset(train_dataset)
+    test_dataset = extract_group_dataset(test_dataset)
     model = C45(train_dataset)
     model.generate_decision_tree()
-    test_records = 0
-    accurate_records = 0
-    for item in test_dataset:
-        test_records += item[CLASS_COUNTER]
-        prediction = model.get_prediction(item)
-        if prediction == item[CLASS_ATTRIBUTE]:
-            accurate_records += item[CLASS_COUNTER]
-    return accurate_records / test_records
+    # Predicted class of the model -> index in the test class list
+    test_index = {
+        cls: index for index, cls in enumerate(test_dataset.class_list)
+        }
+    translation = numpy.array(
+        [test_index.get(cls, -1) for cls in model.class_list] + [-1]
+        )
+    predictions = translation[model.predict_codes(test_dataset)]
+    accurate = predictions >= 0
+    accurate_records = test_dataset.counts[
+        numpy.flatnonzero(accurate), predictions[accurate]
+        ].sum()
+    return accurate_records / test_dataset.counts.sum()
 
 
 def calculate_lower_bound_accuracy(
-    train_dataset:List[dict], test_dataset:List[dict]
+    train_dataset:CountTable, test_dataset:CountTable
     ) -> float:
-    counter = RecordCounter()
-    for item in train_dataset:
-        counter.record(item[CLASS_ATTRIBUTE], item[CLASS_COUNTER])
-    decision = counter.get_most_frequent_class()
-    test_records = 0
-    accurate_records = 0
-    for item in test_dataset:
-        test_records += item[CLASS_COUNTER]
-        if item[CLASS_ATTRIBUTE] == decision:
-            accurate_records += item[CLASS_COUNTER]
+    train_dataset = extract_group_dataset(train_dataset)
+    test_dataset = extract_group_dataset(test_dataset)
+    train_counts = train_dataset.counts.sum(axis=0)
+    decision = train_dataset.class_list[int(numpy.argmax(train_counts))]
+    test_records = test_dataset.counts.sum()
+    if decision not in test_dataset.class_list:
+        return 0.0
+    accurate_records = test_dataset.counts[
+        :, test_dataset.class_list.index(decision)
+        ].sum()
     return accurate_records / test_records
 
 
+def calculate_accuracy_result(
+    train_dataset:ColumnarDataset, test_dataset:ColumnarDataset,
+    private_train_dataset:CountTable, private_test_dataset:CountTable
+    ) -> Tuple[float, float, float]:
+    # Baseline, classification and lower bound accuracy
+    group_train_dataset = extract_group_dataset(train_dataset)
+    group_test_dataset = extract_group_dataset(test_dataset)
+    raw_accuracy = calculate_classification_accuracy(
+        group_train_dataset, group_test_dataset
+        )
+    anonymized_accuracy = calculate_classification_accuracy(
+        private_train_dataset, private_test_dataset
+        )
+    lower_bound_accuracy = calculate_lower_bound_accuracy(
+        group_train_dataset, group_test_dataset
+        )
+    return raw_accuracy, anonymized_accuracy, lower_bound_accuracy
+
+
 def print_accuracy_result(raw_acc, anonymized_acc, lower_bound_acc):
     print("Baseline accuracy (BA): {} %".format(raw_acc * 100))
     print("Classification accuracy (CA): {} %".format(anonymized_acc * 100))
@@ -1,15 +1,24 @@
 import logging
+import numpy
 from bisect import bisect
-from typing import Tuple
 
-from settings import TAXO_NODE_NAME, TAXO_NODE_CHILD
-from src.utility import interval_to_str
+from src.dataset import CODE_TYPE
+from src.taxonomy import TaxonomyIndex, ROOT_CODE
+from src.utility import interval_to_str, intervals_to_str
 
 
 class CommonMapper:
     def get_general_value(self, value):
         raise NotImplementedError()
 
+    def get_general_codes(self, column:numpy.ndarray) -> numpy.ndarray:
+        # Codes of general values of a dataset column
+        raise NotImplementedError()
+
+    def get_general_labels(self) -> list:
+        # General value of every code returned by get_general_codes
+        raise NotImplementedError()
+
     def specialize(self, value):
         raise NotImplementedError()
 
@@ -18,81 +27,81 @@ class CommonMapper:
 
 
 class TaxonomyMapper(CommonMapper):
-    def __init__(self, node:dict):
-        assert node[TAXO_NODE_CHILD]
-        self.parent_list = {}
-        self.leaf_list = {}
-        self.current_parent = {}
+    def __init__(self, index:TaxonomyIndex):
+        assert not index.is_leaf(ROOT_CODE)
+        # Leafs under a node have consecutive leaf codes (see TaxonomyIndex)
+        self.index = index
+        self.leaf_values = index.leaf_values
         self.exported = False
-        root_value = node[TAXO_NODE_NAME]
-        for child in node[TAXO_NODE_CHILD]:
-            node_value = child[TAXO_NODE_NAME]
-            leafs = self.__scan_tree(child)   
-            logging.debug("Next parent of %s is %s", str(leafs), node_value)
-            for leaf in leafs:
-                self.current_parent[leaf] = root_value
-            if child[TAXO_NODE_CHILD]:  # this node is not leaf
-                self.leaf_list[node_value] = leafs
-
-    def __scan_tree(self, node:dict) -> list:
-        node_value = node[TAXO_NODE_NAME]
-        child_list = node[TAXO_NODE_CHILD]
-        # Is a leaf
-        if not child_list:   
-            self.parent_list[node_value] = []
-            return [node_value]
-        # Not a leaf
-        leafs = []
-        for child in child_list:
-            new_leafs = self.__scan_tree(child)
-            leafs.extend(new_leafs)
-        for leaf in leafs:
-            self.parent_list[leaf].append(node_value)
-        return leafs
+        leaf_cnt = len(self.leaf_values)
+        # Leaf code -> node code of the current general value
+        self.current_table = numpy.zeros(leaf_cnt, dtype=CODE_TYPE)
+        # Leaf code -> node code of the general value after the current
+        # general value is specialized
+        self.next_table = numpy.zeros(leaf_cnt, dtype=CODE_TYPE)
+        self.__set_next_values(ROOT_CODE)
+
+    def __set_next_values(self, node_code:int):
+        if self.index.is_leaf(node_code):   # Value is a leaf
+            leaf_from, leaf_to = self.index.get_leaf_range(node_code)
+            self.next_table[leaf_from:leaf_to] = node_code
+        for child_code in self.index.get_childs(node_code).tolist():
+            leaf_from, leaf_to = self.index.get_leaf_range(child_code)
+            logging.debug(
+                "Next parent of %s is %s", 
+                str(self.leaf_values[leaf_from:leaf_to]), 
+                self.index.get_value(child_code)
+                )
+            self.next_table[leaf_from:leaf_to] = child_code
+
+    def get_node_code(self, value) -> int:
+        return self.index.get_node_code(value)
 
     def get_general_value(self, value):
+        leaf_code = self.index.leaf_codes[value]
         if not self.exported:
-            if not self.parent_list[value]:
-                return value
-            return self.parent_list[value][-1]
-        return self.current_parent[value]
+            return self.index.get_value(self.next_table[leaf_code])
+        return self.index.get_value(self.current_table[leaf_code])
+
+    def get_general_codes(self, column:numpy.ndarray) -> numpy.ndarray:
+        # column holds leaf codes
+        if not self.exported:
+            return self.next_table[column]
+        return self.current_table[column]
+
+    def get_general_labels(self) -> list:
+        return self.index.values
 
     def specialize(self, value):
-        for leaf_value in self.leaf_list.get(value, []):
-            self.current_parent[leaf_value] = value
-            # If value has leafs, then it is not a leaf
-            self.parent_list[leaf_value].pop()
-            new_parent = self.get_general_value(leaf_value)
-            if new_parent != leaf_value: # leaf value still has parent
-                if not new_parent in self.leaf_list:
-                    self.leaf_list[new_parent] = []
-                logging.debug(
-                    "Next parent of %s is %s", 
-                    leaf_value, new_parent
-                    )
-                self.leaf_list[new_parent].append(leaf_value)
-        if not self.leaf_list.get(value):   # Value is a leaf
-            self.current_parent[value] = value
-        else:
-            self.leaf_list[value] = []
+        node_code = self.index.get_node_code(value)
+        leaf_from, leaf_to = self.index.get_leaf_range(node_code)
+        self.current_table[leaf_from:leaf_to] = node_code
+        self.__set_next_values(node_code)
 
     def clean_up(self):
         self.exported = True
-        self.parent_list = {}
-        self.leaf_list = {}
 
 
 class IntervalMapper(CommonMapper):
     def __init__(self, from_value:float, to_value:float):
         self.split_values = [from_value, to_value]
 
-    def get_general_value(self, value:float) -> Tuple[float,float]:
-        index = bisect(self.split_values, value)
+    def get_general_value(self, value:float) -> str:
+        split_values = sorted(self.split_values)
+        index = bisect(split_values, value)
         assert index > 0
-        assert index < len(self.split_values)
-        return interval_to_str(
-            self.split_values[index-1], self.split_values[index]
-            )
+        assert index < len(split_values)
+        return interval_to_str(split_values[index-1], split_values[index])
+
+    def get_general_codes(self, column:numpy.ndarray) -> numpy.ndarray:
+        # Index of the interval of each value
+        split_values = numpy.sort(self.split_values)
+        codes = numpy.searchsorted(split_values, column, side='right') - 1
+        assert ((codes >= 0) & (codes < len(split_values) - 1)).all()
+        return codes
+
+    def get_general_labels(self) -> list:
+        return intervals_to_str(sorted(self.split_values))
 
     def specialize(self, value:float):
         self.split_values.append(value)
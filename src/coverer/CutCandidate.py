@@ -1,11 +1,14 @@
 import logging
 import math
-import random
+import numpy
 from typing import Iterator, List
 
-from settings import TAXO_NODE_NAME, TAXO_NODE_CHILD, CLASS_ATTRIBUTE, DIGIT, \
-    UTILITY_FUNCTION
-from src.utility import RecordCounter, exp_mechanism, interval_to_str
+from settings import DIGIT, UTILITY_FUNCTION
+from src.sampler import exp_mechanism_log_weights, log_normalize, \
+    sample_log_weights
+from src.taxonomy import TaxonomyIndex
+from src.utility import RecordCounter, class_histogram, get_batch_utility, \
+    interval_to_str, prefix_split_counts
 from .CommonMapper import TaxonomyMapper, IntervalMapper
 from .DatasetNode import DatasetNode
 
@@ -21,9 +24,11 @@ class CutCandidate:
         self.child_counter = {}
         self.splittable = True
         self.score = None
+        self.refreshed_version = None
     
     def add_data_node(self, node:DatasetNode, counter:RecordCounter=None):
         self.data_nodes.append(node)
+        self.refreshed_version = None
         if counter:
             if not self.counter:
                 self.counter = counter
@@ -31,6 +36,9 @@ class CutCandidate:
                 self.counter = self.counter + counter
 
     def refresh_data_nodes(self):
+        if self.refreshed_version == DatasetNode.split_version:
+            return
+        self.refreshed_version = DatasetNode.split_version
         need_refresh = False
         for node in self.data_nodes:
             if not node.is_leaf():
@@ -47,11 +55,11 @@ class CutCandidate:
                 new_nodes.extend(leafs)
         self.data_nodes = new_nodes
 
-    def get_all_items(self) -> Iterator[dict]:
+    def get_nonempty_nodes(self) -> Iterator[DatasetNode]:
         self.refresh_data_nodes()
         for node in self.data_nodes:
-            for item in node.get_all_items():
-                yield item
+            if node.get_size():
+                yield node
 
     def calculate_score(self):
         assert self.child_counter
@@ -60,67 +68,89 @@ class CutCandidate:
     def export_value(self):
         raise NotImplementedError()
 
-    def transfer_value(self):
-        self.refresh_data_nodes()
-        value = self.export_value()
-        for node in self.data_nodes:
-            node.insert_represent_value(self.attribute, value)
+    def get_general_code(self, mapper) -> int:
+        # Code of export_value in the general labels of the mapper
+        raise NotImplementedError()
 
 
 class CategoryCutCandidate(CutCandidate):
-    def __init__(self, att, taxo_node:dict):
+    def __init__(self, att, index:TaxonomyIndex, node_code:int):
         super().__init__(att)
-        self.taxo_node = taxo_node
+        self.index = index
+        self.node_code = node_code
 
     def export_value(self):
-        return self.taxo_node[TAXO_NODE_NAME]
+        return self.index.get_value(self.node_code)
 
-    def child_count(self, class_list:list, mapper:TaxonomyMapper):
+    def get_general_code(self, mapper:TaxonomyMapper) -> int:
+        return self.node_code
+
+    def get_child_values(self) -> list:
+        return [
+            self.index.get_value(code)
+            for code in self.index.get_childs(self.node_code).tolist()
+            ]
+
+    def child_count(self, class_list:list):
         logging.debug(
             "Couting child of %s, attribute %s", 
             self.export_value(), self.attribute
             )
-        if not self.taxo_node[TAXO_NODE_CHILD]:
+        if self.index.is_leaf(self.node_code):
             self.splittable = False
             return
-        value_counter = {
-            node[TAXO_NODE_NAME]: RecordCounter(class_list)
-            for node in self.taxo_node[TAXO_NODE_CHILD]
+        # Leafs of every child are a range of leaf codes, so the counts of
+        # the childs are sums of consecutive leaf counts
+        leaf_from, leaf_to = self.index.get_leaf_range(self.node_code)
+        child_starts = self.index.get_child_boundaries(self.node_code)[:-1]
+        nodes = list(self.get_nonempty_nodes())
+        if nodes:
+            histogram = class_histogram(
+                numpy.concatenate(
+                    [node.get_column(self.attribute) for node in nodes]
+                    ) - leaf_from,
+                numpy.concatenate(
+                    [node.get_class_codes() for node in nodes]
+                    ),
+                leaf_to - leaf_from,
+                len(class_list)
+                )
+            histogram = numpy.add.reduceat(
+                histogram, child_starts - leaf_from, axis=0
+                )
+        else:
+            histogram = numpy.zeros(
+                (len(child_starts), len(class_list)), dtype=numpy.int64
+                )
+        self.child_counter = {
+            value: RecordCounter.from_counts(class_list, histogram[index])
+            for index, value in enumerate(self.get_child_values())
             }
-        for item in self.get_all_items():
-            value = item[self.attribute]
-            general_value = mapper.get_general_value(value)
-            value_counter[general_value].record(item[CLASS_ATTRIBUTE])
-        self.child_counter = value_counter
 
     def specialize(self, mapper:TaxonomyMapper) \
         -> List['CategoryCutCandidate']:
-        assert self.taxo_node[TAXO_NODE_CHILD]
+        assert not self.index.is_leaf(self.node_code)
         child_candidates = []
-        data_node_record = {}
-        for taxo_child in self.taxo_node[TAXO_NODE_CHILD]:
-            child_value = taxo_child[TAXO_NODE_NAME]
-            candidate = CategoryCutCandidate(self.attribute, taxo_child)
-            candidate.counter = self.child_counter[child_value]
+        for child_code in self.index.get_childs(self.node_code).tolist():
+            candidate = CategoryCutCandidate(
+                self.attribute, self.index, child_code
+                )
+            candidate.counter = self.child_counter[candidate.export_value()]
             child_candidates.append(candidate)
-            data_node_record[child_value] = None
+        # Leaf code l of an item under this candidate falls into child
+        # child_table[l - leaf_from]
+        leaf_from, leaf_to = self.index.get_leaf_range(self.node_code)
+        child_table = self.index.get_child_table(self.node_code)
         self.refresh_data_nodes()
         for data_node in self.data_nodes:
-            for value in data_node_record:
-                new_node = DatasetNode()
-                data_node.insert_child(new_node)
-                data_node_record[value] = new_node
-            for item in data_node.get_all_items():
-                value = item[self.attribute]
-                general_value = mapper.get_general_value(value)
-                data_node_record[general_value].insert_item(item)
-            data_node.clean_up()
-            for candidate in child_candidates:
-                candidate.add_data_node(
-                    data_node_record[candidate.taxo_node[TAXO_NODE_NAME]]
-                    )
-        for taxo_child in self.taxo_node[TAXO_NODE_CHILD]:
-            mapper.specialize(taxo_child[TAXO_NODE_NAME])
+            group_codes = child_table[
+                data_node.get_column(self.attribute) - leaf_from
+                ]
+            new_nodes = data_node.split(group_codes, len(child_candidates))
+            for candidate, new_node in zip(child_candidates, new_nodes):
+                candidate.add_data_node(new_node)
+        for candidate in child_candidates:
+            mapper.specialize(candidate.export_value())
         return child_candidates
 
 
@@ -137,7 +167,13 @@ class IntervalCutCandidate(CutCandidate):
     def export_value(self) -> str:
         return interval_to_str(self.from_value, self.to_value)
 
-    def find_split_value(self, class_list:list, sensi:float, edp:float):
+    def get_general_code(self, mapper:IntervalMapper) -> int:
+        return int(mapper.get_general_codes(numpy.array([self.from_value]))[0])
+
+    def find_split_value(
+        self, class_list:list, sensi:float, edp:float, 
+        rng:numpy.random.Generator
+        ):
         logging.debug(
             "Finding split value of %s, attribute %s", 
             self.export_value(), self.attribute
@@ -145,49 +181,58 @@ class IntervalCutCandidate(CutCandidate):
         if self.to_value - self.from_value <= SMALLEST_SEG:
             self.splittable = False
             return
-        value_counter = {}
         # Count
-        for item in self.get_all_items():
-            value = item[self.attribute]
-            if not (value in value_counter):
-                value_counter[value] = RecordCounter(class_list)
-            value_counter[value].record(item[CLASS_ATTRIBUTE])
-        if not value_counter:
+        nodes = list(self.get_nonempty_nodes())
+        if not nodes:
             self.splittable = False
             return
-        # Prepare weight
-        if not self.from_value in value_counter:
-            value_counter[self.from_value] = RecordCounter(class_list)
-        value_counter[self.to_value] = RecordCounter(class_list)
-        part_counter = {
-            self.LEFT: RecordCounter(class_list),
-            self.RIGHT: RecordCounter(class_list),
-            }
-        for value in value_counter:
-            part_counter[self.RIGHT] += value_counter[value]
-        sorted_values = sorted(value_counter.keys())
-        weights = []
-        intervals = []
-        pre_value = sorted_values[0]
-        # Weight calculation
-        for value in sorted_values[1:]:
-            part_counter[self.LEFT] += value_counter[pre_value]
-            part_counter[self.RIGHT] -= value_counter[pre_value]
-            intervals.append((pre_value, value))
-            score = UTILITY_FUNCTION(self.counter, part_counter)
-            w = exp_mechanism(edp, sensi, score)*(value-pre_value)
-            weights.append(w)
-            pre_value = value
-        logging.info("List of splitting intervals: %s", str(intervals))
-        logging.info("List of corresponding weights: %s", str(weights))
+        distinct_values, value_codes = numpy.unique(
+            numpy.concatenate(
+                [node.get_column(self.attribute) for node in nodes]
+                ),
+            return_inverse=True
+            )
+        histogram = class_histogram(
+            value_codes.ravel(), 
+            numpy.concatenate(
+                [node.get_class_codes() for node in nodes]
+                ),
+            len(distinct_values), 
+            len(class_list)
+            )
+        # Prepare boundaries, value i stays between boundaries i and i+1
+        if distinct_values[0] != self.from_value:
+            distinct_values = numpy.insert(distinct_values, 0, self.from_value)
+            histogram = numpy.insert(histogram, 0, 0, axis=0)
+        boundaries = numpy.append(distinct_values, self.to_value)
+        histogram = numpy.append(
+            histogram, numpy.zeros((1, len(class_list)), histogram.dtype), 
+            axis=0
+            )
+        # Weight calculation, for all intervals at once
+        scores = get_batch_utility(UTILITY_FUNCTION)(
+            self.counter.counts, prefix_split_counts(histogram)
+            )
+        widths = numpy.diff(boundaries)
+        log_weights = exp_mechanism_log_weights(
+            scores, edp, sensi, numpy.log(widths)
+            )
+        # The last interval ends at to_value, which can not be a split value
+        if widths[-1] <= SMALLEST_SEG:
+            log_weights[-1] = -numpy.inf
+        logging.info("List of splitting boundaries: %s", boundaries)
+        if numpy.isneginf(log_weights).all():
+            self.splittable = False
+            return
+        logging.info(
+            "List of corresponding log probabilities: %s", 
+            log_normalize(log_weights)
+            )
         # Exp choose
+        index = sample_log_weights(log_weights, rng)
+        interval = (boundaries[index].item(), boundaries[index+1].item())
         while True:
-            interval = random.choices(intervals, weights=weights)[0]
-            if (interval != intervals[-1]) \
-                or (interval[1]-interval[0] > SMALLEST_SEG):   # Okay
-                break
-        while True:
-            split_value = random.uniform(interval[0], interval[1])
+            split_value = rng.uniform(interval[0], interval[1])
             split_value = round(split_value, DIGIT)
             if split_value > interval[1]:
                 split_value = interval[1]
@@ -197,15 +242,15 @@ class IntervalCutCandidate(CutCandidate):
         logging.info("Split value is %f", split_value)
         # Re-count
         self.split_value = split_value
+        left_part = boundaries < self.split_value
         self.child_counter = {
-            self.LEFT: RecordCounter(class_list),
-            self.RIGHT: RecordCounter(class_list),
+            self.LEFT: RecordCounter.from_counts(
+                class_list, histogram[left_part].sum(axis=0)
+                ),
+            self.RIGHT: RecordCounter.from_counts(
+                class_list, histogram[~left_part].sum(axis=0)
+                ),
             }
-        for value in sorted_values:
-            if value < self.split_value:
-                self.child_counter[self.LEFT] += value_counter[value]
-            else:
-                self.child_counter[self.RIGHT] += value_counter[value]
 
     def specialize(self, mapper:IntervalMapper) \
         -> List['IntervalCutCandidate']:
@@ -225,17 +270,12 @@ class IntervalCutCandidate(CutCandidate):
             child_candidates.append(candidate)
         self.refresh_data_nodes()
         for data_node in self.data_nodes:
-            left_node = DatasetNode()
-            right_node = DatasetNode()
-            data_node.insert_child(left_node)
-            data_node.insert_child(right_node)
-            for item in data_node.get_all_items():
-                value = item[self.attribute]
-                if value < self.split_value:
-                    left_node.insert_item(item)
-                else:
-                    right_node.insert_item(item)
-            data_node.clean_up()
+            # 0 for left node, 1 for right node
+            group_codes = (
+                data_node.get_column(self.attribute)
+                >= self.split_value
+                ).astype(int)
+            left_node, right_node = data_node.split(group_codes, 2)
             for candidate in child_candidates:
                 if candidate.to_value == self.split_value:
                     candidate.add_data_node(left_node)
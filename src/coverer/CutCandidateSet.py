@@ -1,30 +1,46 @@
+import copy
 import logging
 import math
-import random
+import numpy
 from itertools import chain
-from typing import Iterator
 
 from settings import CLASS_ATTRIBUTE, TAXO_ROOT, TAXO_FROM, TAXO_TO, \
     UTILITY_FUNCTION
-from src.utility import RecordCounter, exp_mechanism, information_gain
+from src.dataset import CODE_TYPE, UNKNOWN_CODE
+from src.sampler import ExpMechanismSampler, get_generator
+from src.utility import RecordCounter, information_gain
 from src.exceptions import NumberOfClassValuesException
+from src.taxonomy import get_taxonomy_index, ROOT_CODE
 from .CutCandidate import CategoryCutCandidate, IntervalCutCandidate
 from .DatasetNode import DatasetNode
 from .ValueMapperSet import ValueMapperSet
 
 
 class CutCandidateSet:
-    def __init__(self, taxo_tree:dict, root:DatasetNode):
+    def __init__(self, taxo_tree:dict, root:DatasetNode, rng=None):
+        self.rng = get_generator(rng)
+        self.root = root
         self.unsplittable_list = []
         self.candidate_list = []
         self.new_float_cands = []
         self.new_category_cands = []
         self.mapper_set = ValueMapperSet(taxo_tree)
+        root.dataset = self.mapper_set.encode_dataset(root.dataset)
         # Class attribute scan
-        general_count = RecordCounter()
-        for item in root.get_all_items():
-            general_count.record(item[CLASS_ATTRIBUTE])
-        self.class_list = list(general_count.count.keys())
+        class_count = numpy.bincount(
+            root.dataset.get_class_codes(),
+            minlength=len(root.dataset.get_class_list())
+            )
+        self.class_list = [
+            cls 
+            for cls, cnt in zip(root.dataset.get_class_list(), class_count)
+            if cnt > 0
+            ]
+        # Class codes of the coverer refer to self.class_list
+        root.dataset = root.dataset.recode(CLASS_ATTRIBUTE, self.class_list)
+        general_count = RecordCounter.from_counts(
+            self.class_list, class_count[class_count > 0]
+            )
         # Sensitivity (greater than 0)
         if UTILITY_FUNCTION == information_gain:
             if len(self.class_list) <= 1:
@@ -33,11 +49,15 @@ class CutCandidateSet:
             self.sensi = math.log2(len(self.class_list))
         else: # max_gain
             self.sensi = 1
+        # Scores of candidate_list, in the same order
+        self.sampler = ExpMechanismSampler(self.sensi)
         # Generate candidates
         for att in taxo_tree:
             att_taxo = taxo_tree[att]
             if TAXO_ROOT in att_taxo: # Category attribute
-                candidate = CategoryCutCandidate(att, att_taxo[TAXO_ROOT])
+                candidate = CategoryCutCandidate(
+                    att, get_taxonomy_index(taxo_tree, att), ROOT_CODE
+                    )
                 self.new_category_cands.append(candidate)
             else:   # Float attribute
                 candidate = IntervalCutCandidate(
@@ -47,18 +67,25 @@ class CutCandidateSet:
             candidate.add_data_node(root, general_count)
         self.category_count_childs()
 
+    def fork(self, rng=None) -> 'CutCandidateSet':
+        # Independent copy of the current state, with its own generator.
+        # The encoded dataset is never modified, all copies share it
+        memo = {id(self.root.dataset): self.root.dataset}
+        cut_set = copy.deepcopy(self, memo)
+        cut_set.rng = get_generator(rng)
+        return cut_set
+
     def determine_new_splits(self, edp:float):
         for candidate in self.new_float_cands:
             if (candidate.splittable) and (not candidate.split_value):
-                candidate.find_split_value(self.class_list, self.sensi, edp)
+                candidate.find_split_value(
+                    self.class_list, self.sensi, edp, self.rng
+                    )
 
     def category_count_childs(self):
         for candidate in self.new_category_cands:
             if (candidate.splittable) and (not candidate.child_counter):
-                candidate.child_count(
-                    self.class_list, 
-                    self.mapper_set.get_mapper_by_att(candidate.attribute)
-                    )
+                candidate.child_count(self.class_list)
 
     def calculate_candidate_score(self):
         for candidate in chain(self.new_category_cands, self.new_float_cands):
@@ -69,28 +96,22 @@ class CutCandidateSet:
                     candidate.export_value(), candidate.score
                     )
                 self.candidate_list.append(candidate)
+                self.sampler.append(candidate.score)
             else:
                 self.unsplittable_list.append(candidate)
         self.new_category_cands = []
         self.new_float_cands = []
     
-    def get_score_list(self) -> Iterator[float]:
-        for candidate in self.candidate_list:
-            assert not candidate.score is None
-            yield candidate.score
-
     def select_candidate(self, edp:float) -> int:
         if not self.candidate_list:
             return -1
-        weights = [
-            exp_mechanism(edp, self.sensi, score) 
-            for score in self.get_score_list()
-            ]
-        logging.info("Candidate weights: %s", str(weights))
-        chosen_index = random.choices(
-            list(range(len(weights))), 
-            weights=weights
-            )[0]
+        self.sampler.set_edp(edp)
+        chosen_index = self.sampler.sample(self.rng)
+        logging.info(
+            "Candidate score: %f, best score: %f", 
+            self.candidate_list[chosen_index].score, 
+            self.sampler.get_scores().max()
+            )
         return chosen_index
 
     def specialize_candidate(self, index:int):
@@ -104,6 +125,7 @@ class CutCandidateSet:
         last_candidate = self.candidate_list.pop()
         if index < len(self.candidate_list):  # Index is not the last
             self.candidate_list[index] = last_candidate
+        self.sampler.swap_remove(index)
         # Commit
         child_candidates = chosen_candidate.specialize(
             self.mapper_set.get_mapper_by_att(chosen_candidate.attribute)
@@ -119,8 +141,27 @@ class CutCandidateSet:
             )
 
     def transfer_candidate_values(self):
-        for candidate in chain(self.candidate_list, self.unsplittable_list):
-            candidate.transfer_value()
+        # General codes of the leafs, in the order of the mapper attributes.
+        # Data nodes of a candidate may have been split by other
+        # candidates, their leafs are a range of the DFS ordered leafs
+        attributes = self.mapper_set.get_attributes()
+        leafs, ranges = self.root.get_leaf_ranges()
+        general_codes = numpy.full(
+            (len(leafs), len(attributes)), UNKNOWN_CODE, dtype=CODE_TYPE
+            )
+        for index, att in enumerate(attributes):
+            mapper = self.mapper_set.get_mapper_by_att(att)
+            for candidate in chain(
+                self.candidate_list, self.unsplittable_list
+                ):
+                if candidate.attribute != att:
+                    continue
+                code = candidate.get_general_code(mapper)
+                for node in candidate.data_nodes:
+                    leaf_from, leaf_to = ranges[id(node)]
+                    general_codes[leaf_from:leaf_to, index] = code
+        for leaf, leaf_codes in zip(leafs, general_codes):
+            leaf.general_codes = leaf_codes
 
     def export_mapper_set(self) -> ValueMapperSet:
         self.mapper_set.clean_up()
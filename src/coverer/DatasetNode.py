@@ -1,80 +1,150 @@
 import logging
 import numpy
-from typing import List, Iterator
+from typing import Dict, List, Iterator, Tuple
 
-from settings import CLASS_ATTRIBUTE, LOG_NOISE_LEN
-from src.utility import RecordCounter
+from settings import CLASS_ATTRIBUTE, LOG_NOISE_ROW
+from src.dataset import ColumnarDataset, CountTable, CODE_TYPE, UNKNOWN_CODE
+from src.sampler import get_generator, noisy_counts
+from src.utility import class_histogram, group_rows
 
 
 class DatasetNode:
-    def __init__(self, dataset:List[dict]=None):
-        self.represent = {}
-        self.childs = []
-        if not dataset:
-            self.dataset = []
-        else:
-            assert isinstance(dataset, list)
-            self.dataset = dataset
+    # Increased whenever any node is split, so holders of leaf lists know
+    # when their lists may be out of date
+    split_version = 0
 
-    def insert_item(self, item:dict):
-        self.dataset.append(item)
+    def __init__(self, dataset:ColumnarDataset=None, rows:numpy.ndarray=None):
+        # All nodes of a tree share one dataset, a node only holds the 
+        # indexes of its items in that dataset
+        self.childs = []
+        # Code of the general value of every attribute (see export_dataset),
+        # labels are only made when the tree is exported
+        self.general_codes = None
+        self.dataset = dataset
+        if (rows is None) and (dataset is not None):
+            rows = numpy.arange(len(dataset))
+        self.rows = rows
 
     def insert_child(self, child_node:'DatasetNode'):
-        child_node.represent.update(self.represent)
+        if self.general_codes is not None:
+            child_node.general_codes = self.general_codes.copy()
         self.childs.append(child_node)
 
-    def clean_up(self):
-        self.dataset = []
-        self.represent = {}
+    def split(self, group_codes:numpy.ndarray, group_cnt:int) \
+        -> List['DatasetNode']:
+        # Item i goes to child group_codes[i], each child gets a slice of 
+        # the rows sorted by group
+        child_nodes = []
+        for child_rows in group_rows(self.rows, group_codes, group_cnt):
+            child_node = DatasetNode(self.dataset, child_rows)
+            self.insert_child(child_node)
+            child_nodes.append(child_node)
+        self.clean_up()
+        DatasetNode.split_version += 1
+        return child_nodes
 
-    def insert_represent_value(self, att, value):
-        self.represent[att] = value
+    def clean_up(self):
+        self.rows = None
+        self.general_codes = None
 
     def is_leaf(self) -> bool:
         return not self.childs
 
+    def get_size(self) -> int:
+        if self.rows is None:
+            return 0
+        return len(self.rows)
+
+    def get_column(self, att) -> numpy.ndarray:
+        return self.dataset.get_column(att)[self.rows]
+
+    def get_class_codes(self) -> numpy.ndarray:
+        return self.dataset.get_class_codes()[self.rows]
+
     def get_all_leafs(self) -> List['DatasetNode']:
-        if not self.childs:
-            return [self]
+        # In DFS order
         leafs = []
-        for child in self.childs:
-            leafs.extend(child.get_all_leafs())
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if not node.childs:
+                leafs.append(node)
+            else:
+                stack.extend(reversed(node.childs))
         return leafs
 
+    def get_leaf_ranges(self) -> Tuple[List['DatasetNode'], dict]:
+        # Leafs in DFS order, and (by id of the node) the range [from, to)
+        # of the leafs under every node of the tree
+        leafs = []
+        ranges = {}
+        stack = [(self, None)]
+        while stack:
+            node, leaf_from = stack.pop()
+            if leaf_from is not None:   # All childs are done
+                ranges[id(node)] = (leaf_from, len(leafs))
+            elif not node.childs:
+                ranges[id(node)] = (len(leafs), len(leafs) + 1)
+                leafs.append(node)
+            else:
+                stack.append((node, len(leafs)))
+                stack.extend((child, None) for child in reversed(node.childs))
+        return leafs, ranges
+
     def get_all_items(self) -> Iterator[dict]:
-        for item in self.dataset:
+        if self.rows is None:
+            return
+        for item in self.dataset.take(self.rows):
             yield item
 
-    def export_dataset(self, edp:float, class_list:list) -> List[dict]:
-        noise_list = []
-        ex_dataset = []
+    def export_dataset(
+        self, edp:float, class_list:list, labels:Dict[object, list], rng=None
+        ) -> CountTable:
+        # labels: attribute -> general value of every code, in the order of
+        # the general codes of the leafs
+        rng = get_generator(rng)
         leafs = self.get_all_leafs()
-        for leaf in leafs:
-            ex_item = leaf.represent.copy()
-            counter = RecordCounter(class_list)
-            for item in leaf.get_all_items():
-                cls = item[CLASS_ATTRIBUTE]
-                if not (cls in counter.count):
-                    logging.warn(
-                        "Classifying value %s not present in train dataset", 
-                        cls
-                        )
-                counter.record(cls)
-            zero_case = True
-            for cls in counter.count:
-                noise = numpy.random.laplace(scale=1/edp)
-                if len(noise_list) < LOG_NOISE_LEN:
-                    noise_list.append(noise)
-                cnt = counter.count[cls] + noise
-                if cnt < 0:
-                    cnt = 0
-                else:
-                    cnt = round(cnt)
-                header = "{att}:{val}".format(att=CLASS_ATTRIBUTE, val=cls)
-                if cnt != 0:
-                    zero_case = False
-                ex_item[header] = cnt
-            if not zero_case:
-                ex_dataset.append(ex_item)
-        logging.info("Laplacian noises: %s ...", str(noise_list))
-        return ex_dataset
+        # Class codes of the dataset -> index in class list
+        class_list = list(class_list)
+        class_translation = self.dataset.translate_codes(
+            CLASS_ATTRIBUTE, class_list
+            )
+        leaf_sizes = numpy.array([leaf.get_size() for leaf in leafs])
+        row_list = [leaf.rows for leaf in leafs if leaf.get_size()]
+        rows = numpy.concatenate(row_list) if row_list \
+            else numpy.zeros(0, dtype=numpy.intp)
+        class_codes = self.dataset.get_class_codes()[rows]
+        unknown = class_translation[class_codes] == UNKNOWN_CODE
+        for code in numpy.unique(class_codes[unknown]).tolist():
+            cls = self.dataset.get_class_list()[code]
+            logging.warn(
+                "Classifying value %s not present in train dataset", cls
+                )
+            class_translation[code] = len(class_list)
+            class_list.append(cls)
+        counts = class_histogram(
+            numpy.repeat(numpy.arange(len(leafs)), leaf_sizes),
+            class_translation[class_codes],
+            len(leafs),
+            len(class_list)
+            )
+        # All noises at once
+        noisy_matrix = noisy_counts(counts, edp, rng)
+        logging.info(
+            "First rows of noisy counts: \n%s", noisy_matrix[:LOG_NOISE_ROW]
+            )
+        non_zero = noisy_matrix.any(axis=1)
+        general_codes = numpy.array(
+            [leaf.general_codes for leaf in leafs], dtype=CODE_TYPE
+            ).reshape(len(leafs), len(labels))[non_zero]
+        return CountTable(
+            ColumnarDataset.from_codes(
+                {
+                    att: general_codes[:, index]
+                    for index, att in enumerate(labels)
+                    },
+                labels
+                ),
+            class_list, 
+            noisy_matrix[non_zero]
+            )
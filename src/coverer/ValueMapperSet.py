@@ -1,4 +1,9 @@
+import numpy
+
 from settings import TAXO_ROOT, TAXO_FROM, TAXO_TO
+from src.dataset import ColumnarDataset, UNKNOWN_CODE
+from src.exceptions import TaxoTreeCoverageException
+from src.taxonomy import get_taxonomy_index
 from .CommonMapper import TaxonomyMapper, IntervalMapper, CommonMapper
 
 
@@ -7,8 +12,9 @@ class ValueMapperSet:
         self.mappers = {}
         for att in taxo_tree:
             if TAXO_ROOT in taxo_tree[att]: # Category attribute
-                root = taxo_tree[att][TAXO_ROOT]
-                self.mappers[att] = TaxonomyMapper(root)
+                self.mappers[att] = TaxonomyMapper(
+                    get_taxonomy_index(taxo_tree, att)
+                    )
             else: # Float attribute
                 self.mappers[att] = IntervalMapper(
                     taxo_tree[att][TAXO_FROM], taxo_tree[att][TAXO_TO]
@@ -20,7 +26,35 @@ class ValueMapperSet:
     def get_mapper_by_att(self, att) -> CommonMapper:
         return self.mappers[att]
 
+    def get_general_labels(self) -> dict:
+        # Attribute -> general value of every general code
+        return {
+            att: mapper.get_general_labels()
+            for att, mapper in self.mappers.items()
+            }
+
+    def get_schema(self) -> dict:
+        # Attribute -> is float, for importing datasets
+        return {
+            att: isinstance(mapper, IntervalMapper)
+            for att, mapper in self.mappers.items()
+            }
+
     def clean_up(self):
         for att in self.mappers:
             self.mappers[att].clean_up()
 
+    def encode_dataset(self, dataset:ColumnarDataset) -> ColumnarDataset:
+        # Category attributes are recoded to leaf codes of their mappers,
+        # which are in DFS order: the leafs under any taxonomy node are a
+        # range of codes
+        for att, mapper in self.mappers.items():
+            if not isinstance(mapper, TaxonomyMapper):
+                continue
+            encoded = dataset.recode(att, mapper.leaf_values)
+            unknown = encoded.get_column(att) == UNKNOWN_CODE
+            if unknown.any():
+                row = int(numpy.argmax(unknown))
+                raise TaxoTreeCoverageException(att, dataset[row][att])
+            dataset = encoded
+        return dataset
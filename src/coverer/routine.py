@@ -1,9 +1,17 @@
 import logging
 import math
+import multiprocessing
 import numpy
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple
 
-from settings import ALPHA, MIN_ENSURE, LOG_NOISE_ROW
+from settings import ALPHA, MIN_ENSURE, LOG_NOISE_ROW, CLASS_ATTRIBUTE, \
+    CHUNK_SIZE
+from src.dataset import ColumnarDataset, CountTable, CODE_TYPE, \
+    UNKNOWN_CODE
+from src.file_handler import import_dataset_chunks
+from src.sampler import get_generator, noisy_counts
+from src.utility import class_histogram
 from src.validator import count_float_attribute
 from .CutCandidateSet import CutCandidateSet
 from .DatasetNode import DatasetNode
@@ -11,13 +19,20 @@ from .ValueMapperSet import ValueMapperSet
 
 
 def generate_dp_dataset(
-    dataset:List[dict], taxo_tree:dict, edp:float, steps:int
-    ) -> Tuple[List[dict], ValueMapperSet, list]:
-    float_att_cnt = count_float_attribute(dataset)
+    dataset:ColumnarDataset, taxo_tree:dict, edp:float, steps:int, 
+    rng=None
+    ) -> Tuple[CountTable, ValueMapperSet, list]:
+    cut_set = CutCandidateSet(taxo_tree, DatasetNode(dataset), rng)
+    return specialize_cut_set(cut_set, edp, steps)
+
+
+def specialize_cut_set(cut_set:CutCandidateSet, edp:float, steps:int) \
+    -> Tuple[CountTable, ValueMapperSet, list]:
+    # DiffGen from the current (initial) state of cut_set, which is changed
+    data_root = cut_set.root
+    float_att_cnt = count_float_attribute(data_root.dataset)
     edp_s = edp / 2 / (float_att_cnt + 2*steps)
     logging.debug("edp' =  %f", edp_s)
-    data_root = DatasetNode(dataset)
-    cut_set = CutCandidateSet(taxo_tree, data_root)
     cut_set.determine_new_splits(edp_s)
     cut_set.calculate_candidate_score()
     for i in range(steps):
@@ -30,36 +45,160 @@ def generate_dp_dataset(
         cut_set.specialize_candidate(index)
         cut_set.determine_new_splits(edp_s)
         cut_set.calculate_candidate_score()
+    mapper_set = cut_set.export_mapper_set()
     cut_set.transfer_candidate_values()
     return (
-        data_root.export_dataset(edp/2, cut_set.class_list),
-        cut_set.export_mapper_set(),
+        data_root.export_dataset(
+            edp/2, cut_set.class_list, mapper_set.get_general_labels(),
+            cut_set.rng
+            ),
+        mapper_set,
         cut_set.class_list
         )
 
 
+def generate_dp_sweep(
+    dataset:ColumnarDataset, taxo_tree:dict, sweep_settings:List[tuple],
+    workers:int=1
+    ) -> List[Tuple[CountTable, ValueMapperSet, list]]:
+    # Result of generate_dp_dataset for each (edp, steps, seed) of
+    # sweep_settings. The non-private initial state (encoded data, mappers,
+    # candidates and their counts) is built once and each setting runs on
+    # a fork of it
+    base_cut_set = CutCandidateSet(taxo_tree, DatasetNode(dataset))
+    if workers <= 1:
+        return [
+            specialize_cut_set(base_cut_set.fork(seed), edp, steps)
+            for edp, steps, seed in sweep_settings
+            ]
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=get_fork_context(),
+        initializer=init_sweep_worker,
+        initargs=(base_cut_set,)
+        ) as pool:
+        return list(pool.map(run_sweep_worker_task, sweep_settings))
+
+
+def get_fork_context():
+    # Forked processes share the memory of the parent until it is written
+    # (copy on write), elsewhere the arguments of the processes are pickled
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+# Initial state of a pool process
+worker_cut_set = None
+
+
+def init_sweep_worker(base_cut_set:CutCandidateSet):
+    global worker_cut_set
+    worker_cut_set = base_cut_set
+
+
+def run_sweep_worker_task(sweep_setting:tuple) \
+    -> Tuple[CountTable, ValueMapperSet, list]:
+    edp, steps, seed = sweep_setting
+    return specialize_cut_set(worker_cut_set.fork(seed), edp, steps)
+
+
 def apply_generalization(
-    dataset:List[dict], mapper_set:ValueMapperSet, class_list:list, edp:float
-    ) -> List[dict]:
-    data_root = DatasetNode(dataset)
+    dataset:ColumnarDataset, mapper_set:ValueMapperSet, class_list:list, 
+    edp:float, rng=None
+    ) -> CountTable:
+    data_root = DatasetNode(mapper_set.encode_dataset(dataset))
+    attributes = mapper_set.get_attributes()
+    data_root.general_codes = numpy.full(
+        len(attributes), UNKNOWN_CODE, dtype=CODE_TYPE
+        )
     leaf_list = data_root.get_all_leafs()
-    for att in mapper_set.get_attributes():
+    for index, att in enumerate(attributes):
         mapper = mapper_set.get_mapper_by_att(att)
         new_leaf_list = []
         for data_node in leaf_list:
-            child_record = {}
-            for item in data_node.get_all_items():
-                gen_value = mapper.get_general_value(item[att])
-                if not gen_value in child_record:
-                    new_child = DatasetNode()
-                    new_child.insert_represent_value(att, gen_value)
-                    data_node.insert_child(new_child)
-                    child_record[gen_value] = new_child
-                child_record[gen_value].insert_item(item)
-            data_node.clean_up()
-            new_leaf_list.extend(data_node.get_all_leafs())
+            if not data_node.get_size():
+                continue
+            general_codes, group_codes = numpy.unique(
+                mapper.get_general_codes(data_node.get_column(att)),
+                return_inverse=True
+                )
+            new_childs = data_node.split(
+                group_codes.ravel(), len(general_codes)
+                )
+            for code, new_child in zip(general_codes.tolist(), new_childs):
+                new_child.general_codes[index] = code
+            new_leaf_list.extend(new_childs)
         leaf_list = new_leaf_list
-    return data_root.export_dataset(edp, class_list)
+    return data_root.export_dataset(
+        edp, class_list, mapper_set.get_general_labels(), rng
+        )
+
+
+def stream_generalization(
+    file_path, mapper_set:ValueMapperSet, class_list:list, edp:float, 
+    chunk_size:int=CHUNK_SIZE, rng=None
+    ) -> CountTable:
+    # Same result as apply_generalization, for datasets larger than memory.
+    # Memory is bounded by the number of distinct general items
+    rng = get_generator(rng)
+    class_list = list(class_list)
+    attributes = mapper_set.get_attributes()
+    cell_counts = {}
+    for chunk in import_dataset_chunks(
+        file_path, chunk_size, mapper_set.get_schema()
+        ):
+        if not len(chunk):
+            continue
+        chunk = mapper_set.encode_dataset(chunk)
+        class_codes = chunk.translate_codes(CLASS_ATTRIBUTE, class_list)
+        for cls, code in zip(chunk.get_class_list(), class_codes.tolist()):
+            if code == UNKNOWN_CODE:
+                logging.warn(
+                    "Classifying value %s not present in train dataset", cls
+                    )
+                class_list.append(cls)
+        class_codes = chunk.translate_codes(CLASS_ATTRIBUTE, class_list)
+        general_codes = numpy.column_stack([
+            mapper_set.get_mapper_by_att(att).get_general_codes(
+                chunk.get_column(att)
+                )
+            for att in attributes
+            ])
+        cells, cell_index = numpy.unique(
+            general_codes, axis=0, return_inverse=True
+            )
+        histogram = class_histogram(
+            cell_index.ravel(), class_codes[chunk.get_class_codes()],
+            len(cells), len(class_list)
+            )
+        for cell, counts in zip(map(tuple, cells.tolist()), histogram):
+            if cell in cell_counts:
+                old_counts = cell_counts[cell]
+                counts = counts.copy()
+                counts[:len(old_counts)] += old_counts
+            cell_counts[cell] = counts
+    # Noise is added once, after all chunks are counted
+    count_matrix = numpy.zeros(
+        (len(cell_counts), len(class_list)), dtype=numpy.int64
+        )
+    for index, counts in enumerate(cell_counts.values()):
+        count_matrix[index, :len(counts)] = counts
+    noisy_matrix = noisy_counts(count_matrix, edp, rng)
+    logging.info(
+        "First rows of noisy counts: \n%s", noisy_matrix[:LOG_NOISE_ROW]
+        )
+    non_zero = noisy_matrix.any(axis=1)
+    cell_matrix = numpy.array(list(cell_counts.keys()), dtype=CODE_TYPE)
+    cell_matrix = cell_matrix.reshape(len(cell_counts), len(attributes))
+    columns = {
+        att: cell_matrix[non_zero, index]
+        for index, att in enumerate(attributes)
+        }
+    return CountTable(
+        ColumnarDataset(columns, mapper_set.get_general_labels()), class_list, 
+        noisy_matrix[non_zero]
+        )
 
 
 def generate_dp_matrix(org_matrix:numpy.array, new_dim:int, edp:float) \
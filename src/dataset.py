@@ -0,0 +1,240 @@
+import numpy
+from typing import Any, Dict, Iterator, List, Tuple
+
+from settings import CLASS_ATTRIBUTE
+from src.utility import class_histogram
+
+
+CODE_TYPE = numpy.int32
+FLOAT_TYPE = numpy.float64
+UNKNOWN_CODE = -1
+
+
+class ColumnarDataset:
+    def __init__(
+        self, columns:Dict[Any, numpy.ndarray], categories:Dict[Any, list]
+        ):
+        # Float attributes are stored as they are, category attributes
+        # (including the class attribute) are stored as codes of categories
+        self.columns = columns
+        self.categories = categories
+        assert len({len(column) for column in columns.values()}) <= 1
+
+    @classmethod
+    def from_columns(cls, raw_columns:Dict[Any, list]) -> 'ColumnarDataset':
+        columns = {}
+        categories = {}
+        for att, values in raw_columns.items():
+            if att != CLASS_ATTRIBUTE \
+                and all(isinstance(value, float) for value in values):
+                columns[att] = numpy.array(values, dtype=FLOAT_TYPE)
+                continue
+            index = {}
+            codes = [index.setdefault(value, len(index)) for value in values]
+            columns[att] = numpy.array(codes, dtype=CODE_TYPE)
+            categories[att] = list(index.keys())
+        return cls(columns, categories)
+
+    @classmethod
+    def from_codes(
+        cls, codes:Dict[Any, numpy.ndarray], categories:Dict[Any, list]
+        ) -> 'ColumnarDataset':
+        # Category columns given as codes of categories. Only the categories
+        # which are used are kept, coded in order of first appearance (as
+        # from_columns does)
+        columns = {}
+        used_categories = {}
+        for att, column in codes.items():
+            used_codes, first_rows, new_codes = numpy.unique(
+                column, return_index=True, return_inverse=True
+                )
+            order = numpy.argsort(first_rows)
+            ranks = numpy.empty(len(order), dtype=CODE_TYPE)
+            ranks[order] = numpy.arange(len(order), dtype=CODE_TYPE)
+            columns[att] = ranks[new_codes.ravel()]
+            used_categories[att] = [
+                categories[att][code] for code in used_codes[order].tolist()
+                ]
+        return cls(columns, used_categories)
+
+    @classmethod
+    def from_dicts(cls, dataset:List[dict]) -> 'ColumnarDataset':
+        if not dataset:
+            return cls({}, {})
+        raw_columns = {
+            att: [item[att] for item in dataset]
+            for att in dataset[0]
+            }
+        return cls.from_columns(raw_columns)
+
+    def __len__(self) -> int:
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, index:int) -> dict:
+        return {
+            att: self.decode_value(att, self.columns[att][index])
+            for att in self.columns
+            }
+
+    def __iter__(self) -> Iterator[dict]:
+        attributes = self.get_attributes()
+        value_lists = [self.get_values(att).tolist() for att in attributes]
+        for values in zip(*value_lists):
+            yield dict(zip(attributes, values))
+
+    def to_dicts(self) -> List[dict]:
+        return list(iter(self))
+
+    def get_attributes(self) -> list:
+        return list(self.columns.keys())
+
+    def is_float_attribute(self, att) -> bool:
+        return att not in self.categories
+
+    def get_column(self, att) -> numpy.ndarray:
+        return self.columns[att]
+
+    def get_categories(self, att) -> list:
+        return self.categories[att]
+
+    def decode_value(self, att, value):
+        if self.is_float_attribute(att):
+            return float(value)
+        return self.categories[att][value]
+
+    def get_values(self, att) -> numpy.ndarray:
+        column = self.columns[att]
+        if self.is_float_attribute(att):
+            return column
+        category_arr = numpy.empty(len(self.categories[att]), dtype=object)
+        category_arr[:] = self.categories[att]
+        return category_arr[column]
+
+    def get_class_codes(self) -> numpy.ndarray:
+        return self.columns[CLASS_ATTRIBUTE]
+
+    def get_class_list(self) -> list:
+        return self.categories[CLASS_ATTRIBUTE]
+
+    def take(self, indices:numpy.ndarray) -> 'ColumnarDataset':
+        columns = {
+            att: column[indices]
+            for att, column in self.columns.items()
+            }
+        return ColumnarDataset(columns, self.categories)
+
+    def select(self, attributes:list) -> 'ColumnarDataset':
+        return ColumnarDataset(
+            {att: self.columns[att] for att in attributes},
+            {
+                att: self.categories[att]
+                for att in attributes
+                if att in self.categories
+                }
+            )
+
+    def translate_codes(self, att, categories:list) -> numpy.ndarray:
+        # Codes of current categories in the new categories list
+        index = {value: code for code, value in enumerate(categories)}
+        return numpy.array(
+            [index.get(value, UNKNOWN_CODE) for value in self.categories[att]],
+            dtype=CODE_TYPE
+            )
+
+    def recode(self, att, categories:list) -> 'ColumnarDataset':
+        # Values which are not in the new categories list get UNKNOWN_CODE
+        translation = self.translate_codes(att, categories)
+        columns = self.columns.copy()
+        columns[att] = translation[self.columns[att]]
+        new_categories = self.categories.copy()
+        new_categories[att] = list(categories)
+        return ColumnarDataset(columns, new_categories)
+
+
+class CountTable:
+    # Generalized items, each one with the (noisy) count of every class.
+    # dataset holds the attribute values, counts is an items x classes matrix
+    def __init__(
+        self, dataset:ColumnarDataset, class_list:list, counts:numpy.ndarray
+        ):
+        assert counts.shape == (len(dataset), len(class_list))
+        self.dataset = dataset
+        self.class_list = class_list
+        self.counts = counts
+
+    @classmethod
+    def from_dataset(
+        cls, dataset:ColumnarDataset, weights:numpy.ndarray=None
+        ) -> 'CountTable':
+        # Identical items (apart from the class) become one item with the
+        # count (or sum of weights) of each class
+        attributes = dataset.get_attributes()
+        attributes.remove(CLASS_ATTRIBUTE)
+        class_list = dataset.get_class_list()
+        if not attributes:
+            cell_codes = numpy.zeros(len(dataset), dtype=numpy.intp)
+            first_rows = numpy.zeros(min(len(dataset), 1), dtype=numpy.intp)
+        else:
+            keys = numpy.stack(
+                [dataset.get_column(att) for att in attributes], axis=1
+                ).astype(FLOAT_TYPE)
+            _, first_rows, cell_codes = numpy.unique(
+                keys, axis=0, return_index=True, return_inverse=True
+                )
+        counts = class_histogram(
+            cell_codes.ravel(), dataset.get_class_codes(), len(first_rows),
+            len(class_list), weights
+            )
+        return cls(
+            dataset.select(attributes).take(first_rows), class_list, counts
+            )
+
+    @classmethod
+    def from_coo(
+        cls, dataset:ColumnarDataset, class_list:list,
+        cell_ids:numpy.ndarray, class_ids:numpy.ndarray, counts:numpy.ndarray
+        ) -> 'CountTable':
+        # Counts given as (item, class, count) triples, other counts are 0
+        matrix = numpy.zeros((len(dataset), len(class_list)), counts.dtype)
+        matrix[cell_ids, class_ids] = counts
+        return cls(dataset, class_list, matrix)
+
+    def to_coo(self) \
+        -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # (item, class, count) triples of the non-zero counts
+        cell_ids, class_ids = numpy.nonzero(self.counts)
+        return cell_ids, class_ids, self.counts[cell_ids, class_ids]
+
+    def take(self, indices:numpy.ndarray) -> 'CountTable':
+        return CountTable(
+            self.dataset.take(indices), self.class_list, self.counts[indices]
+            )
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __getitem__(self, index:int) -> dict:
+        item = self.dataset[index]
+        counts = self.counts[index].tolist()
+        item.update(zip(self.get_class_headers(), counts))
+        return item
+
+    def __iter__(self) -> Iterator[dict]:
+        headers = self.get_class_headers()
+        for item, counts in zip(self.dataset, self.counts.tolist()):
+            item.update(zip(headers, counts))
+            yield item
+
+    def to_dicts(self) -> List[dict]:
+        return list(iter(self))
+
+    def get_class_headers(self) -> list:
+        return [
+            "{att}:{val}".format(att=CLASS_ATTRIBUTE, val=cls)
+            for cls in self.class_list
+            ]
+
+    def get_attributes(self) -> list:
+        return self.dataset.get_attributes() + self.get_class_headers()
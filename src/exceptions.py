@@ -21,6 +21,23 @@ class UnsupportedFileTypeException(FileException):
     detail = "File type is not supported: {}"
 
 
+class DatasetParseException(FileException):
+    code = 203
+    detail = "Can not parse file {path}: {errors}"
+    def __init__(self, file_path, errors:dict):
+        # errors: column -> (number of bad rows, first bad line numbers)
+        self.errors = errors
+        self.detail = self.detail.format(
+            path=file_path,
+            errors="; ".join(
+                "{att} has {cnt} bad rows (lines {lines})".format(
+                    att=att, cnt=cnt, lines=", ".join(map(str, lines))
+                    )
+                for att, (cnt, lines) in errors.items()
+                )
+            )
+
+
 class AttributeException(BaseException):
     code = 300
     detail = "Attribute {} has some problems"
@@ -79,6 +96,19 @@ class TaxoTreeCoverageException(BaseException):
         self.detail = self.detail.format(att=att, val=value)
 
 
+class InputDataException(BaseException):
+    code = 390
+    detail = "Input data has {cnt} problems:\n{problems}"
+    def __init__(self, exceptions:list):
+        self.exceptions = exceptions
+        self.detail = self.detail.format(
+            cnt=len(exceptions),
+            problems="\n".join(
+                "{} - {}".format(e.code, e.detail) for e in exceptions
+                )
+            )
+
+
 class NumberOfClassValuesException(BaseException):
     code = 500
     detail = "Training dataset has less than 2 classifying values. "\
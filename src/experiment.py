@@ -0,0 +1,143 @@
+import logging
+import math
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+from sklearn.model_selection import train_test_split
+from typing import List, Tuple
+
+from settings import TRAIN_DATA_SIZE, EXPERIMENT_CONFIDENCE
+from src.classifier.routine import calculate_accuracy_result
+from src.coverer.CutCandidateSet import CutCandidateSet
+from src.coverer.DatasetNode import DatasetNode
+from src.coverer.routine import specialize_cut_set, apply_generalization, \
+    get_fork_context
+from src.dataset import ColumnarDataset
+
+
+METRICS = [
+    "baseline_accuracy", "classification_accuracy", "lower_bound_accuracy",
+    "cost_quality", "benefit"
+    ]
+MAX_SPLIT_SEED = 2**32 - 1
+
+
+def split_dataset(
+    dataset:ColumnarDataset, rng:numpy.random.Generator
+    ) -> Tuple[ColumnarDataset, ColumnarDataset]:
+    train_index, test_index = train_test_split(
+        numpy.arange(len(dataset)),
+        train_size=TRAIN_DATA_SIZE,
+        random_state=int(rng.integers(MAX_SPLIT_SEED))
+        )
+    return dataset.take(train_index), dataset.take(test_index)
+
+
+def run_repetition(
+    train_dataset:ColumnarDataset, test_dataset:ColumnarDataset,
+    base_cut_set:CutCandidateSet, edp:float, steps:int,
+    rng:numpy.random.Generator
+    ) -> dict:
+    # Anonymization (on a fork of the initial state) and classification
+    cut_set = base_cut_set.fork(rng)
+    private_train_dataset, mapper_set, class_list = specialize_cut_set(
+        cut_set, edp, steps
+        )
+    private_test_dataset = apply_generalization(
+        test_dataset, mapper_set, class_list, edp/2, cut_set.rng
+        )
+    raw_acc, anonymized_acc, lower_bound_acc = calculate_accuracy_result(
+        train_dataset, test_dataset, private_train_dataset,
+        private_test_dataset
+        )
+    return {
+        "baseline_accuracy": float(raw_acc),
+        "classification_accuracy": float(anonymized_acc),
+        "lower_bound_accuracy": float(lower_bound_acc),
+        "cost_quality": float(raw_acc - anonymized_acc),
+        "benefit": float(anonymized_acc - lower_bound_acc),
+        }
+
+
+# Splits and initial states of the runs, shared by the pool processes
+worker_runs = None
+
+
+def init_worker(runs:list):
+    global worker_runs
+    worker_runs = runs
+
+
+def run_worker_task(task:tuple) -> dict:
+    edp, steps, run, seed_seq = task
+    result = {"edp": edp, "steps": steps, "run": run}
+    result.update(run_repetition(
+        *worker_runs[run], edp, steps, numpy.random.default_rng(seed_seq)
+        ))
+    return result
+
+
+def run_experiments(
+    dataset:ColumnarDataset, taxo_tree:dict, edps:list, steps_list:list,
+    runs:int, seed=None, workers:int=1
+    ) -> List[dict]:
+    # Each run has its own split and its own non-private initial state,
+    # which is forked for every (edp, steps) pair. Every random stream is
+    # spawned from seed, so results do not depend on the process count
+    seed_seq = numpy.random.SeedSequence(seed)
+    logging.info("Experiment seed entropy: %s", seed_seq.entropy)
+    split_seq, task_seq = seed_seq.spawn(2)
+    run_data = []
+    for run_seq in split_seq.spawn(runs):
+        train_dataset, test_dataset = split_dataset(
+            dataset, numpy.random.default_rng(run_seq)
+            )
+        base_cut_set = CutCandidateSet(taxo_tree, DatasetNode(train_dataset))
+        run_data.append((train_dataset, test_dataset, base_cut_set))
+    grid = [
+        (edp, steps, run)
+        for edp in edps
+        for steps in steps_list
+        for run in range(runs)
+        ]
+    tasks = [
+        task + (child_seq,)
+        for task, child_seq in zip(grid, task_seq.spawn(len(grid)))
+        ]
+    if workers <= 1:
+        init_worker(run_data)
+        return [run_worker_task(task) for task in tasks]
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=get_fork_context(),
+        initializer=init_worker,
+        initargs=(run_data,)
+        ) as pool:
+        return list(pool.map(run_worker_task, tasks))
+
+
+def summarize_results(
+    results:List[dict], confidence:float=EXPERIMENT_CONFIDENCE
+    ) -> List[dict]:
+    # Mean, standard deviation and t confidence interval of each metric
+    # for each (edp, steps) pair
+    groups = {}
+    for result in results:
+        groups.setdefault((result["edp"], result["steps"]), []).append(result)
+    summary = []
+    for (edp, steps), group in groups.items():
+        row = {"edp": edp, "steps": steps, "runs": len(group)}
+        for metric in METRICS:
+            values = numpy.array([result[metric] for result in group])
+            mean = values.mean()
+            std = values.std(ddof=1) if len(values) > 1 else 0.0
+            margin = 0.0
+            if len(values) > 1:
+                margin = stats.t.ppf((1 + confidence) / 2, len(values) - 1) \
+                    * std / math.sqrt(len(values))
+            row[metric + "_mean"] = float(mean)
+            row[metric + "_std"] = float(std)
+            row[metric + "_ci_low"] = float(mean - margin)
+            row[metric + "_ci_high"] = float(mean + margin)
+        summary.append(row)
+    return summary
@@ -1,70 +1,542 @@
 import csv
+import hashlib
 import json
+import logging
 import numpy
 import os
+import shutil
+from itertools import islice
+from typing import Dict, Iterator
 
-from settings import MISSING_VALUE
-from src.exceptions import OpenFileException, UnsupportedFileTypeException
+from settings import MISSING_VALUE, DATASET_CACHE_DIR, CLASS_ATTRIBUTE, \
+    TAXO_ROOT, TAXO_INDEX_CACHE, SPARSE_EXPORT
+from src.dataset import ColumnarDataset, CountTable, CODE_TYPE, FLOAT_TYPE
+from src.exceptions import OpenFileException, UnsupportedFileTypeException, \
+    DatasetParseException
+from src.taxonomy import TaxonomyIndex, TAXO_INDEX, compile_taxonomy_tree
 
 
 CSV_EXT = ".csv"
 JSON_EXT = ".json"
+NPY_EXT = ".npy"
+NPZ_EXT = ".npz"
+CACHE_SCHEMA_FILE = "schema.json"
+NPZ_SCHEMA_KEY = "schema"
+NPZ_CLASS_LIST_KEY = "class_list"
+NPZ_COO_KEYS = ("cell_ids", "class_ids", "counts")
+ROW_LENGTH_ERROR = "(number of values)"
+ERROR_LINE_CNT = 5  # Reported line numbers of each bad column
+PARSE_CHUNK_SIZE = 10000    # Rows parsed at a time
+WRITE_CHUNK_SIZE = 10000    # Rows formatted at a time
+TAXO_INDEX_SUFFIX = ".index"
+TAXO_INDEX_SOURCE_KEY = "source"
+TAXO_INDEX_ATTRIBUTES_KEY = "attributes"
 
 
-def import_dataset(file_path):
+def get_taxonomy_schema(taxo_tree:dict) -> Dict[str, bool]:
+    # Attribute -> True for float attributes, False for category attributes
+    return {att: TAXO_ROOT not in info for att, info in taxo_tree.items()}
+
+
+def import_dataset(file_path, schema:dict=None, cache_dir=DATASET_CACHE_DIR):
+    # schema: attribute -> is float (see get_taxonomy_schema), the type of
+    # other attributes is guessed from their values
     file_name, file_ext = os.path.splitext(file_path)
     if file_ext == CSV_EXT:
-        return import_csv_dataset(file_path)
+        if cache_dir is None:
+            return import_csv_dataset(file_path, schema)
+        return import_cached_dataset(file_path, schema, cache_dir)
+    if file_ext == NPZ_EXT:
+        return import_npz_dataset(file_path)
     raise UnsupportedFileTypeException(file_path)
 
 
-def import_csv_dataset(file_path):
-    dataset = []
-    try:
-        with open(file_path) as csv_file:
-            for row in csv.DictReader(csv_file, skipinitialspace=True):
-                converted_row = {}
-                if MISSING_VALUE in row.values():
-                    continue
-                for key, value in row.items():
-                    try:
-                        float_value = float(value)
-                        value = float_value
-                    except ValueError:
-                        pass
-                    converted_row[key] = value
-                dataset.append(converted_row)
-    except IOError:
+def get_dataset_cache_path(file_path, schema:dict, cache_dir):
+    # A cache is used while the path, the modification time and the size
+    # of the file (and the schema) stay the same. Returns the path of the
+    # cache and the prefix shared by all caches of the file
+    abs_path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
         raise OpenFileException(file_path)
+    prefix = "{name}-{key}-".format(
+        name=os.path.basename(abs_path),
+        key=hashlib.sha1(abs_path.encode()).hexdigest()[:16]
+        )
+    schema_key = hashlib.sha1(
+        json.dumps(schema, sort_keys=True).encode()
+        ).hexdigest()[:8]
+    cache_path = os.path.join(
+        cache_dir,
+        "{prefix}{mtime}-{size}-{schema}".format(
+            prefix=prefix, mtime=stat.st_mtime_ns, size=stat.st_size,
+            schema=schema_key
+            )
+        )
+    return cache_path, prefix
+
+
+def import_cached_dataset(file_path, schema:dict, cache_dir) \
+    -> ColumnarDataset:
+    cache_path, prefix = get_dataset_cache_path(file_path, schema, cache_dir)
+    if os.path.isdir(cache_path):
+        try:
+            return import_dataset_cache(cache_path)
+        except (OSError, ValueError, KeyError):
+            logging.warning("Dataset cache %s is broken", cache_path)
+    dataset = import_csv_dataset(file_path, schema)
+    try:
+        export_dataset_cache(cache_path, dataset)
+    except OSError:
+        logging.warning("Can not write dataset cache %s", cache_path)
+        return dataset
+    # Caches of older versions of the file
+    for name in os.listdir(cache_dir):
+        old_path = os.path.join(cache_dir, name)
+        if name.startswith(prefix) and old_path != cache_path:
+            shutil.rmtree(old_path, ignore_errors=True)
     return dataset
 
 
-def export_dataset(file_path, dataset):
+def import_dataset_cache(cache_path) -> ColumnarDataset:
+    # Columns are memory-mapped (read only), not read
+    with open(os.path.join(cache_path, CACHE_SCHEMA_FILE)) as json_file:
+        schema = json.load(json_file)
+    return build_dataset(schema, lambda index: numpy.load(
+        os.path.join(cache_path, "{}{}".format(index, NPY_EXT)),
+        mmap_mode='r'
+        ))
+
+
+def export_dataset_cache(cache_path, dataset:ColumnarDataset):
+    # Written to a temporary directory first, so a cache is either complete
+    # or missing
+    temp_path = "{}.tmp{}".format(cache_path, os.getpid())
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    try:
+        schema = []
+        for index, (att, values, categories) \
+            in enumerate(get_export_columns(dataset)):
+            numpy.save(
+                os.path.join(temp_path, "{}{}".format(index, NPY_EXT)), values
+                )
+            schema.append({"attribute": att, "categories": categories})
+        with open(os.path.join(temp_path, CACHE_SCHEMA_FILE), 'w') \
+            as json_file:
+            json.dump(schema, json_file)
+        os.replace(temp_path, cache_path)
+    finally:
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+def get_export_columns(dataset) -> list:
+    # (attribute, values or codes, categories or None) of every column of
+    # a ColumnarDataset or a CountTable
+    counts = None
+    if isinstance(dataset, CountTable):
+        counts = dataset.counts
+        class_headers = dataset.get_class_headers()
+        dataset = dataset.dataset
+    columns = [
+        (
+            att,
+            dataset.get_column(att),
+            None if dataset.is_float_attribute(att) \
+                else dataset.get_categories(att)
+            )
+        for att in dataset.get_attributes()
+        ]
+    if counts is not None:
+        columns.extend(
+            (header, counts[:, index], None)
+            for index, header in enumerate(class_headers)
+            )
+    return columns
+
+
+def build_dataset(schema:list, load_column) -> ColumnarDataset:
+    # Dataset of the schema of get_export_columns, load_column(index) gives
+    # the array of a column
+    columns = {}
+    categories = {}
+    for index, column_schema in enumerate(schema):
+        att = column_schema["attribute"]
+        columns[att] = load_column(index)
+        if column_schema["categories"] is not None:
+            categories[att] = column_schema["categories"]
+    return ColumnarDataset(columns, categories)
+
+
+def import_npz_dataset(file_path):
+    # A CountTable for sparse files (see export_sparse_npz_dataset)
+    try:
+        with numpy.load(file_path) as npz_file:
+            schema = json.loads(str(npz_file[NPZ_SCHEMA_KEY]))
+            dataset = build_dataset(
+                schema, lambda index: npz_file[str(index)]
+                )
+            if NPZ_CLASS_LIST_KEY not in npz_file.files:
+                return dataset
+            return CountTable.from_coo(
+                dataset,
+                json.loads(str(npz_file[NPZ_CLASS_LIST_KEY])),
+                *[npz_file[key] for key in NPZ_COO_KEYS]
+                )
+    except IOError:
+        raise OpenFileException(file_path)
+
+
+def import_dataset_chunks(file_path, chunk_size:int, schema:dict=None) \
+    -> Iterator[ColumnarDataset]:
+    file_name, file_ext = os.path.splitext(file_path)
+    if file_ext == CSV_EXT:
+        return import_csv_dataset_chunks(file_path, chunk_size, schema)
+    raise UnsupportedFileTypeException(file_path)
+
+
+def import_csv_dataset(file_path, schema:dict=None) -> ColumnarDataset:
+    chunks = list(
+        import_csv_dataset_chunks(file_path, PARSE_CHUNK_SIZE, schema)
+        )
+    if not chunks:
+        return ColumnarDataset({}, {})
+    # Category codes are the same in all chunks, the last chunk has all
+    # categories
+    return ColumnarDataset(
+        {
+            att: numpy.concatenate([chunk.get_column(att) for chunk in chunks])
+            for att in chunks[-1].get_attributes()
+            },
+        chunks[-1].categories
+        )
+
+
+def import_csv_dataset_chunks(file_path, chunk_size:int, schema:dict=None) \
+    -> Iterator[ColumnarDataset]:
+    # Datasets of every chunk_size rows (all rows if chunk_size is None),
+    # without the rows having missing values. Attributes missing from
+    # schema are float if all their values in the first chunk are numbers.
+    # Category codes of a value stay the same in the later chunks
+    try:
+        with open(file_path, newline='') as csv_file:
+            reader = csv.reader(csv_file, skipinitialspace=True)
+            header = next(reader, None)
+            if header is None:
+                return
+            schema = dict(schema or {})
+            categories = {}
+            first_line = 2
+            while True:
+                rows = list(islice(reader, chunk_size))
+                if not rows:
+                    return
+                yield parse_csv_rows(
+                    file_path, header, rows, first_line, schema, categories
+                    )
+                first_line += len(rows)
+    except IOError:
+        raise OpenFileException(file_path)
+
+
+def parse_csv_rows(
+    file_path, header:list, rows:list, first_line:int, schema:dict,
+    categories:dict
+    ) -> ColumnarDataset:
+    # Columns are parsed at once. schema gets the guessed types, categories
+    # (attribute -> value -> code) gets the new values. Assumes one line
+    # for each row when reporting line numbers
+    errors = {}
+    lines = numpy.arange(first_line, first_line + len(rows))
+    row_lengths = numpy.fromiter(map(len, rows), dtype=int, count=len(rows))
+    # Blank lines are skipped, other rows must have a value for each column
+    bad_rows = (row_lengths != len(header)) & (row_lengths > 0)
+    if bad_rows.any():
+        add_parse_errors(errors, ROW_LENGTH_ERROR, lines[bad_rows])
+    good_rows = numpy.flatnonzero(row_lengths == len(header))
+    if len(good_rows) < len(rows):
+        rows = [rows[index] for index in good_rows.tolist()]
+        lines = lines[good_rows]
+    value_columns = list(zip(*rows)) if rows else [() for att in header]
+    # Float columns are parsed, category columns are coded by the order of
+    # first appearance in this chunk
+    missing = numpy.zeros(len(lines), dtype=bool)
+    parsed_columns = []
+    for att, values in zip(header, value_columns):
+        if schema.get(att, att != CLASS_ATTRIBUTE):
+            floats, value_missing, bad_values = parse_float_values(values)
+            if bad_values is None:
+                schema.setdefault(att, True)
+            elif att in schema:
+                add_parse_errors(errors, att, lines[bad_values])
+            else:   # Guessed as a category attribute
+                schema[att] = False
+        if schema.setdefault(att, False):
+            parsed_columns.append(floats)
+        else:
+            index = {}
+            value_codes = numpy.array(
+                [index.setdefault(value, len(index)) for value in values],
+                dtype=CODE_TYPE
+                )
+            value_missing = value_codes == index.get(MISSING_VALUE, -1)
+            parsed_columns.append((list(index.keys()), value_codes))
+        missing |= value_missing
+    if errors:
+        raise DatasetParseException(file_path, errors)
+    # Rows having any missing value are dropped
+    if missing.any():
+        logging.debug(
+            "Skipped %d rows with missing values", int(missing.sum())
+            )
+    kept_rows = numpy.flatnonzero(~missing)
+    columns = {}
+    for att, parsed in zip(header, parsed_columns):
+        if schema[att]:
+            columns[att] = parsed[kept_rows]
+            continue
+        # Codes of the chunk -> codes of all chunks, new values get codes
+        # by their first appearance in the kept rows
+        chunk_values, value_codes = parsed
+        value_codes = value_codes[kept_rows]
+        kept_codes, first_rows = numpy.unique(value_codes, return_index=True)
+        index = categories.setdefault(att, {})
+        translation = numpy.full(len(chunk_values), -1, dtype=CODE_TYPE)
+        for code in kept_codes[numpy.argsort(first_rows)].tolist():
+            translation[code] = index.setdefault(
+                chunk_values[code], len(index)
+                )
+        columns[att] = translation[value_codes]
+    return ColumnarDataset(
+        columns,
+        {att: list(index.keys()) for att, index in categories.items()}
+        )
+
+
+def parse_float_values(values:tuple):
+    # Floats (NaN for missing values), missing flags and bad value flags
+    # (None if every value is a number or missing)
+    try:
+        floats = numpy.fromiter(map(float, values), FLOAT_TYPE, len(values))
+        return floats, numpy.zeros(len(values), dtype=bool), None
+    except ValueError:
+        pass
+    # Each distinct value is parsed once
+    parsed = {}
+    bad_set = set()
+    for value in set(values):
+        try:
+            parsed[value] = float(value)
+        except ValueError:
+            parsed[value] = numpy.nan
+            if value != MISSING_VALUE:
+                bad_set.add(value)
+    floats = numpy.array([parsed[value] for value in values], dtype=FLOAT_TYPE)
+    missing = numpy.array(values, dtype=object) == MISSING_VALUE
+    if not bad_set:
+        return floats, missing, None
+    bad_values = numpy.array(
+        [value in bad_set for value in values], dtype=bool
+        )
+    return floats, missing, bad_values
+
+
+def add_parse_errors(errors:dict, att, lines:numpy.ndarray):
+    errors[att] = (len(lines), lines[:ERROR_LINE_CNT].tolist())
+
+
+def export_dataset(file_path, dataset, sparse:bool=SPARSE_EXPORT):
+    # sparse: CountTables are exported to .npz files as (item, class, count)
+    # triples of the non-zero counts
     file_name, file_ext = os.path.splitext(file_path)
     if file_ext == CSV_EXT:
         return export_csv_dataset(file_path, dataset)
+    if file_ext == JSON_EXT:
+        return export_json_dataset(file_path, dataset)
+    if file_ext == NPZ_EXT:
+        if sparse and isinstance(dataset, CountTable):
+            return export_sparse_npz_dataset(file_path, dataset)
+        return export_npz_dataset(file_path, dataset)
     raise UnsupportedFileTypeException(file_path)
 
 
+def export_json_dataset(file_path, dataset):
+    try:
+        with open(file_path, 'w') as json_file:
+            json.dump(list(dataset), json_file, indent=4)
+    except IOError:
+        raise OpenFileException(file_path)
+
+
+def export_npz_dataset(file_path, dataset):
+    # Binary columnar format: an array for each column (category codes for
+    # category columns) and the schema of the columns as JSON
+    if not isinstance(dataset, (ColumnarDataset, CountTable)):
+        dataset = ColumnarDataset.from_dicts(list(dataset))
+    write_npz_file(file_path, get_npz_arrays(dataset))
+
+
+def export_sparse_npz_dataset(file_path, table:CountTable):
+    # Columns of the items with a non-zero count (as export_npz_dataset),
+    # the class list and the non-zero counts as (item, class, count).
+    # Integer arrays use the smallest integer types which fit, float
+    # counts (e.g. weighted counts) stay as they are
+    table = table.take(numpy.flatnonzero(table.counts.any(axis=1)))
+    arrays = get_npz_arrays(table.dataset)
+    arrays[NPZ_CLASS_LIST_KEY] = numpy.array(json.dumps(table.class_list))
+    for key, values in zip(NPZ_COO_KEYS, table.to_coo()):
+        if len(values) and numpy.issubdtype(values.dtype, numpy.integer):
+            values = values.astype(
+                numpy.promote_types(
+                    numpy.min_scalar_type(values.min()),
+                    numpy.min_scalar_type(values.max())
+                    )
+                )
+        arrays[key] = values
+    write_npz_file(file_path, arrays)
+
+
+def get_npz_arrays(dataset) -> dict:
+    schema = []
+    arrays = {}
+    for index, (att, values, categories) \
+        in enumerate(get_export_columns(dataset)):
+        arrays[str(index)] = values
+        schema.append({"attribute": att, "categories": categories})
+    arrays[NPZ_SCHEMA_KEY] = numpy.array(json.dumps(schema))
+    return arrays
+
+
+def write_npz_file(file_path, arrays:dict):
+    try:
+        with open(file_path, 'wb') as npz_file:
+            numpy.savez(npz_file, **arrays)
+    except IOError:
+        raise OpenFileException(file_path)
+
+
 def export_csv_dataset(file_path, dataset):
-    attributes = tuple(dataset[0].keys())
-    data_export = [attributes]
-    for row in dataset:
-        item = tuple(row[attribute] for attribute in attributes)
-        data_export.append(item)
     try:
         with open(file_path, 'w', newline='') as csv_file:
             csv_writer = csv.writer(csv_file)
-            csv_writer.writerows(data_export)
+            if isinstance(dataset, (ColumnarDataset, CountTable)):
+                write_csv_columns(csv_writer, dataset)
+                return
+            attributes = tuple(dataset[0].keys())
+            csv_writer.writerow(attributes)
+            csv_writer.writerows(
+                tuple(row[attribute] for attribute in attributes)
+                for row in dataset
+                )
     except IOError:
         raise OpenFileException(file_path)
 
 
-def import_taxonomy_tree(file_path):
+def write_csv_columns(csv_writer, dataset):
+    # Values are taken a column at a time, WRITE_CHUNK_SIZE rows at a time,
+    # so only a chunk of the text is in memory
+    columns = []
+    for att, values, categories in get_export_columns(dataset):
+        labels = None
+        if categories is not None:
+            labels = numpy.empty(len(categories), dtype=object)
+            labels[:] = [str(value) for value in categories]
+        columns.append((att, values, labels))
+    csv_writer.writerow([att for att, values, labels in columns])
+    for start in range(0, len(dataset), WRITE_CHUNK_SIZE):
+        stop = start + WRITE_CHUNK_SIZE
+        csv_writer.writerows(zip(*[
+            values[start:stop].tolist() if labels is None \
+                else labels[values[start:stop]].tolist()
+            for att, values, labels in columns
+            ]))
+
+
+def import_taxonomy_tree(file_path, cache:bool=TAXO_INDEX_CACHE):
+    # Category attributes get their compiled index (see src.taxonomy),
+    # which is cached next to the file
     file_name, file_ext = os.path.splitext(file_path)
-    if file_ext == JSON_EXT:
-        return import_json_taxonomy_tree(file_path)
-    raise UnsupportedFileTypeException(file_path)
+    if file_ext != JSON_EXT:
+        raise UnsupportedFileTypeException(file_path)
+    taxo_tree = import_json_taxonomy_tree(file_path)
+    if not cache:
+        compile_taxonomy_tree(taxo_tree)
+        return taxo_tree
+    cache_path = file_name + TAXO_INDEX_SUFFIX + NPZ_EXT
+    source = get_taxonomy_source_key(file_path)
+    try:
+        import_taxonomy_index(cache_path, source, taxo_tree)
+    except (OSError, ValueError, KeyError):
+        logging.info("Taxonomy index cache %s is not usable", cache_path)
+    if all(
+        TAXO_INDEX in info for info in taxo_tree.values()
+        if isinstance(info, dict) and TAXO_ROOT in info
+        ):
+        return taxo_tree
+    compile_taxonomy_tree(taxo_tree)
+    try:
+        export_taxonomy_index(cache_path, source, taxo_tree)
+    except OSError:
+        logging.warning("Can not write taxonomy index cache %s", cache_path)
+    return taxo_tree
+
+
+def get_taxonomy_source_key(file_path) -> numpy.ndarray:
+    # A cached index is used while the modification time and the size of
+    # the taxonomy file stay the same
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        raise OpenFileException(file_path)
+    return numpy.array([stat.st_mtime_ns, stat.st_size], dtype=numpy.int64)
+
+
+def import_taxonomy_index(cache_path, source:numpy.ndarray, taxo_tree:dict):
+    with numpy.load(cache_path) as npz_file:
+        if not numpy.array_equal(npz_file[TAXO_INDEX_SOURCE_KEY], source):
+            return
+        attributes = json.loads(str(npz_file[TAXO_INDEX_ATTRIBUTES_KEY]))
+        indexes = {}
+        for index, att in enumerate(attributes):
+            if att not in taxo_tree:
+                return
+            indexes[att] = TaxonomyIndex(
+                json.loads(str(npz_file["{}_values".format(index)])),
+                **{
+                    field: npz_file["{}_{}".format(index, field)]
+                    for field in TaxonomyIndex.ARRAY_FIELDS
+                    }
+                )
+    for att, taxo_index in indexes.items():
+        taxo_tree[att][TAXO_INDEX] = taxo_index
+
+
+def export_taxonomy_index(cache_path, source:numpy.ndarray, taxo_tree:dict):
+    attributes = [
+        att for att, info in taxo_tree.items()
+        if isinstance(info, dict) and TAXO_INDEX in info
+        ]
+    arrays = {
+        TAXO_INDEX_SOURCE_KEY: source,
+        TAXO_INDEX_ATTRIBUTES_KEY: numpy.array(json.dumps(attributes))
+        }
+    for index, att in enumerate(attributes):
+        taxo_index = taxo_tree[att][TAXO_INDEX]
+        arrays["{}_values".format(index)] = numpy.array(
+            json.dumps(taxo_index.values)
+            )
+        for field, array in taxo_index.get_arrays().items():
+            arrays["{}_{}".format(index, field)] = array
+    # Written to a temporary file first, so a cache is either complete or
+    # missing
+    temp_path = "{}.tmp{}{}".format(cache_path, os.getpid(), NPZ_EXT)
+    try:
+        numpy.savez(temp_path, **arrays)
+        os.replace(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 
 def import_json_taxonomy_tree(file_path):
@@ -83,21 +555,43 @@ def import_csv_matrix(file_path) -> numpy.array:
     return numpy.array([[float(item) for item in row] for row in data])
 
 
+def import_npz_matrix(file_path) -> numpy.array:
+    try:
+        with numpy.load(file_path) as npz_file:
+            return npz_file["matrix"]
+    except IOError:
+        raise OpenFileException(file_path)
+
+
 def import_matrix(file_path) -> numpy.array:
     file_name, file_ext = os.path.splitext(file_path)
     if file_ext == CSV_EXT:
         return import_csv_matrix(file_path)
+    if file_ext == NPZ_EXT:
+        return import_npz_matrix(file_path)
     raise UnsupportedFileTypeException(file_path)
 
 
 def export_csv_matrix(file_path, matrix:numpy.array, cluster:numpy.array):
+    # Rows and their cluster labels, formatted WRITE_CHUNK_SIZE rows at a
+    # time
     try:
         with open(file_path, 'w', newline='') as csv_file:
             csv_writer = csv.writer(csv_file)
-            for i in range(matrix.shape[0]):
-                row = matrix[i].tolist()
-                row.append('c'+str(cluster[i]))
-                csv_writer.writerow(row)
+            for start in range(0, matrix.shape[0], WRITE_CHUNK_SIZE):
+                stop = start + WRITE_CHUNK_SIZE
+                labels = numpy.char.add('c', cluster[start:stop].astype(str))
+                csv_writer.writerows(
+                    zip(*matrix[start:stop].T.tolist(), labels.tolist())
+                    )
+    except IOError:
+        raise OpenFileException(file_path)
+
+
+def export_npz_matrix(file_path, matrix:numpy.array, cluster:numpy.array):
+    try:
+        with open(file_path, 'wb') as npz_file:
+            numpy.savez(npz_file, matrix=matrix, cluster=cluster)
     except IOError:
         raise OpenFileException(file_path)
 
@@ -106,4 +600,6 @@ def export_matrix(file_path, matrix:numpy.array, cluster:numpy.array):
     file_name, file_ext = os.path.splitext(file_path)
     if file_ext == CSV_EXT:
         return export_csv_matrix(file_path, matrix, cluster)
+    if file_ext == NPZ_EXT:
+        return export_npz_matrix(file_path, matrix, cluster)
     raise UnsupportedFileTypeException(file_path)
@@ -0,0 +1,194 @@
+import numpy
+
+from src.utility import log_exp_mechanism
+
+
+def get_generator(seed=None) -> numpy.random.Generator:
+    # A seed, an existing generator or None (fresh entropy from the OS)
+    if isinstance(seed, numpy.random.Generator):
+        return seed
+    return numpy.random.default_rng(seed)
+
+
+def log_normalize(log_weights:numpy.ndarray) -> numpy.ndarray:
+    # Log probabilities of the weights (log-sum-exp normalisation)
+    log_weights = numpy.asarray(log_weights, dtype=float)
+    max_weight = log_weights.max()
+    assert not numpy.isneginf(max_weight)
+    shifted = log_weights - max_weight
+    return shifted - numpy.log(numpy.exp(shifted).sum())
+
+
+def sample_log_weights(
+    log_weights:numpy.ndarray, rng:numpy.random.Generator, size:int=None
+    ):
+    # Gumbel-max trick: argmax(log_weights + Gumbel noise) is index i with
+    # probability exp(log_weights[i]) / sum(exp(log_weights))
+    log_weights = numpy.asarray(log_weights, dtype=float)
+    assert not numpy.isneginf(log_weights).all()
+    if size is None:
+        noise = rng.gumbel(size=log_weights.shape)
+        return int(numpy.argmax(log_weights + noise))
+    noise = rng.gumbel(size=(size,) + log_weights.shape)
+    return numpy.argmax(log_weights + noise, axis=-1)
+
+
+def exp_mechanism_log_weights(
+    scores:numpy.ndarray, edp:float, sensi:float, 
+    log_bias:numpy.ndarray=None
+    ) -> numpy.ndarray:
+    # log_bias holds extra (log) factors of the weights, e.g. interval widths
+    log_weights = log_exp_mechanism(edp, sensi, scores)
+    if log_bias is not None:
+        log_weights = log_weights + log_bias
+    return log_weights
+
+
+def noisy_counts(
+    counts:numpy.ndarray, edp:float, rng:numpy.random.Generator
+    ) -> numpy.ndarray:
+    # Counts plus Laplace noise of scale 1/edp, rounded and clipped at 0
+    noise = rng.laplace(scale=1/edp, size=counts.shape)
+    return numpy.maximum(numpy.round(counts + noise), 0).astype(numpy.int64)
+
+
+class FenwickTree:
+    # Prefix sums of a growable list of non-negative weights, with 
+    # O(log n) update and O(log n) search of a prefix sum
+    def __init__(self, capacity:int=16):
+        self.size = 0
+        self.values = numpy.zeros(capacity)
+        self.tree = numpy.zeros(capacity + 1)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def rebuild(self, values:numpy.ndarray):
+        self.size = len(values)
+        capacity = max(len(self.values), 1)
+        while capacity < self.size:
+            capacity *= 2
+        self.values = numpy.zeros(capacity)
+        self.values[:self.size] = values
+        # Linear construction: every node pushes its sum to its parent
+        self.tree = numpy.zeros(capacity + 1)
+        self.tree[1:] = self.values
+        for index in range(1, capacity + 1):
+            parent = index + (index & -index)
+            if parent <= capacity:
+                self.tree[parent] += self.tree[index]
+
+    def append(self, value:float):
+        if self.size == len(self.values):
+            self.grow(2*len(self.values))
+        self.size += 1
+        self.update(self.size - 1, value)
+
+    def grow(self, capacity:int):
+        values = self.values[:self.size].copy()
+        self.values = numpy.zeros(capacity)
+        self.rebuild(values)
+
+    def update(self, index:int, value:float):
+        assert 0 <= index < self.size
+        delta = value - self.values[index]
+        self.values[index] = value
+        position = index + 1
+        capacity = len(self.values)
+        while position <= capacity:
+            self.tree[position] += delta
+            position += position & -position
+
+    def swap_remove(self, index:int):
+        # Move the last value to index, then drop the last position
+        last = self.size - 1
+        if index != last:
+            self.update(index, self.values[last])
+        self.update(last, 0)
+        self.size -= 1
+
+    def total(self) -> float:
+        result = 0
+        position = self.size
+        while position > 0:
+            result += self.tree[position]
+            position -= position & -position
+        return result
+
+    def find(self, target:float) -> int:
+        # Smallest index whose inclusive prefix sum is greater than target
+        position = 0
+        step = 1 << (len(self.values).bit_length() - 1)
+        while step:
+            next_position = position + step
+            if next_position <= len(self.values) \
+                and self.tree[next_position] <= target:
+                position = next_position
+                target -= self.tree[next_position]
+            step >>= 1
+        return min(position, self.size - 1)
+
+
+class ExpMechanismSampler:
+    # Exponential mechanism over a changing list of scores. Weights are 
+    # kept as exp(scale*score - log_ref), log_ref is the largest current
+    # log weight, so every stored weight is in [0, 1] and one of them is 1.
+    # The weights are rebuilt whenever that would not hold any more,
+    # otherwise the sums of the tree could cancel out to rounding errors
+    def __init__(self, sensi:float):
+        self.sensi = sensi
+        self.scale = None
+        self.log_ref = -numpy.inf
+        self.scores = numpy.zeros(16)
+        self.size = 0
+        self.weights = FenwickTree()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def get_scores(self) -> numpy.ndarray:
+        return self.scores[:self.size]
+
+    def set_edp(self, edp:float):
+        scale = edp/(2*self.sensi)
+        if scale == self.scale:
+            return
+        self.scale = scale
+        self.refresh_weights()
+
+    def refresh_weights(self):
+        if self.scale is None:
+            return
+        log_weights = self.scale*self.get_scores()
+        self.log_ref = log_weights.max() if self.size else -numpy.inf
+        self.weights.rebuild(numpy.exp(log_weights - self.log_ref))
+
+    def append(self, score:float):
+        if self.size == len(self.scores):
+            self.scores = numpy.append(self.scores, numpy.zeros(self.size))
+        self.scores[self.size] = score
+        self.size += 1
+        if self.scale is None:
+            return
+        log_weight = self.scale*score
+        weight = numpy.exp(log_weight - self.log_ref)
+        if (log_weight > self.log_ref) or (weight == 0):
+            self.refresh_weights()
+        else:
+            self.weights.append(weight)
+
+    def swap_remove(self, index:int):
+        assert 0 <= index < self.size
+        removed_max = self.scale is not None \
+            and self.scale*self.scores[index] >= self.log_ref
+        self.scores[index] = self.scores[self.size - 1]
+        self.size -= 1
+        if removed_max:
+            self.refresh_weights()
+        elif self.scale is not None:
+            self.weights.swap_remove(index)
+
+    def sample(self, rng:numpy.random.Generator) -> int:
+        assert self.size > 0
+        assert self.scale is not None
+        return self.weights.find(rng.random()*self.weights.total())
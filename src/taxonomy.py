@@ -0,0 +1,162 @@
+import logging
+import numpy
+from functools import cached_property
+from typing import List
+
+from settings import TAXO_ROOT, TAXO_NODE_NAME, TAXO_NODE_CHILD
+from src.exceptions import TaxoNodeException, TaxoNodeMissingKeyException
+
+
+PATH_SEP = "/"
+TAXO_INDEX = "index"    # Key of the compiled index in a taxonomy attribute
+ROOT_CODE = 0
+NODE_TYPE = numpy.int32
+
+
+class TaxonomyIndex:
+    # Compiled taxonomy of a category attribute. Nodes are numbered in DFS
+    # preorder, so the subtree of node n is [n, subtree_ends[n]) and its
+    # leafs have consecutive leaf codes [leaf_froms[n], leaf_tos[n]).
+    # Never modified after it is built, all users share one index
+    ARRAY_FIELDS = [
+        "parents", "depths", "subtree_ends", "child_offsets", "child_ids",
+        "leaf_nodes", "leaf_froms", "leaf_tos"
+        ]
+
+    def __init__(self, values:list, **arrays):
+        self.values = values
+        for field in self.ARRAY_FIELDS:
+            array = numpy.asarray(arrays[field], dtype=NODE_TYPE)
+            array.setflags(write=False)
+            setattr(self, field, array)
+        self.leaf_values = [values[code] for code in self.leaf_nodes.tolist()]
+
+    # Value -> code tables, only built when they are used
+    @cached_property
+    def node_codes(self) -> dict:
+        return {value: code for code, value in enumerate(self.values)}
+
+    @cached_property
+    def leaf_codes(self) -> dict:
+        return {value: code for code, value in enumerate(self.leaf_values)}
+
+    @classmethod
+    def compile(cls, root:dict, trace_path:str="") -> 'TaxonomyIndex':
+        # Iterative DFS, so deep taxonomies do not hit the recursion limit
+        values = []
+        parents = []
+        depths = []
+        stack = [(root, -1, 0, trace_path)]
+        while stack:
+            node, parent, depth, path = stack.pop()
+            if not isinstance(node, dict):
+                raise TaxoNodeException(path)
+            if TAXO_NODE_NAME not in node:
+                raise TaxoNodeMissingKeyException(path, TAXO_NODE_NAME)
+            if (TAXO_NODE_CHILD not in node) or \
+                (not isinstance(node[TAXO_NODE_CHILD], list)):
+                raise TaxoNodeMissingKeyException(path, TAXO_NODE_CHILD)
+            code = len(values)
+            values.append(node[TAXO_NODE_NAME])
+            parents.append(parent)
+            depths.append(depth)
+            child_path = path + node[TAXO_NODE_NAME] + PATH_SEP
+            for child in reversed(node[TAXO_NODE_CHILD]):
+                stack.append((child, code, depth + 1, child_path))
+        parents = numpy.array(parents, dtype=NODE_TYPE)
+        depths = numpy.array(depths, dtype=NODE_TYPE)
+        node_cnt = len(values)
+        # Subtree sizes, from the deepest nodes up
+        sizes = numpy.ones(node_cnt, dtype=NODE_TYPE)
+        for depth in range(int(depths.max()), 0, -1):
+            level = numpy.flatnonzero(depths == depth)
+            numpy.add.at(sizes, parents[level], sizes[level])
+        codes = numpy.arange(node_cnt, dtype=NODE_TYPE)
+        subtree_ends = codes + sizes
+        # Childs of node n are child_ids[child_offsets[n]:child_offsets[n+1]]
+        child_ids = numpy.argsort(parents[1:], kind='stable') + 1
+        child_offsets = numpy.zeros(node_cnt + 1, dtype=NODE_TYPE)
+        numpy.cumsum(
+            numpy.bincount(parents[1:], minlength=node_cnt),
+            out=child_offsets[1:]
+            )
+        leaf_nodes = numpy.flatnonzero(sizes == 1)
+        return cls(
+            values,
+            parents=parents,
+            depths=depths,
+            subtree_ends=subtree_ends,
+            child_offsets=child_offsets,
+            child_ids=child_ids,
+            leaf_nodes=leaf_nodes,
+            leaf_froms=numpy.searchsorted(leaf_nodes, codes),
+            leaf_tos=numpy.searchsorted(leaf_nodes, subtree_ends)
+            )
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def get_arrays(self) -> dict:
+        return {field: getattr(self, field) for field in self.ARRAY_FIELDS}
+
+    def get_node_code(self, value) -> int:
+        return self.node_codes[value]
+
+    def get_value(self, code:int):
+        return self.values[code]
+
+    def get_childs(self, code:int) -> numpy.ndarray:
+        return self.child_ids[
+            self.child_offsets[code]:self.child_offsets[code+1]
+            ]
+
+    def get_child_boundaries(self, code:int) -> numpy.ndarray:
+        # Leaf codes of child i of a node are [boundaries[i],
+        # boundaries[i+1])
+        childs = self.get_childs(code)
+        return numpy.append(self.leaf_froms[childs], self.leaf_tos[code])
+
+    def get_child_table(self, code:int) -> numpy.ndarray:
+        # Leaf code l of the node falls into child table[l - leaf_froms[code]]
+        child_sizes = numpy.diff(self.get_child_boundaries(code))
+        return numpy.repeat(
+            numpy.arange(len(child_sizes), dtype=NODE_TYPE), child_sizes
+            )
+
+    def is_leaf(self, code:int) -> bool:
+        return self.child_offsets[code] == self.child_offsets[code+1]
+
+    def is_under(self, code:int, ancestor:int) -> bool:
+        # True if node code is in the subtree of node ancestor
+        return ancestor <= code < self.subtree_ends[ancestor]
+
+    def get_leaf_range(self, code:int) -> tuple:
+        return int(self.leaf_froms[code]), int(self.leaf_tos[code])
+
+    def get_leaf_values(self, code:int=ROOT_CODE) -> List:
+        leaf_from, leaf_to = self.get_leaf_range(code)
+        return self.leaf_values[leaf_from:leaf_to]
+
+
+def compile_taxonomy_tree(taxo_tree:dict):
+    # Compiles the index of every category attribute which has none yet.
+    # Invalid taxonomies are left to the validator, which reports them
+    for att in taxo_tree:
+        if isinstance(taxo_tree[att], dict) and TAXO_ROOT in taxo_tree[att]:
+            try:
+                get_taxonomy_index(taxo_tree, att)
+            except (TaxoNodeException, TaxoNodeMissingKeyException):
+                logging.warning("Taxonomy of attribute %s is invalid", att)
+
+
+def get_taxonomy_index(taxo_tree:dict, att) -> TaxonomyIndex:
+    # Index of a category attribute, compiled the first time it is needed
+    att_taxo = taxo_tree[att]
+    if TAXO_INDEX not in att_taxo:
+        att_taxo[TAXO_INDEX] = TaxonomyIndex.compile(
+            att_taxo[TAXO_ROOT], att + PATH_SEP
+            )
+    return att_taxo[TAXO_INDEX]
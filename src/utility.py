@@ -1,78 +1,195 @@
-import math
 import matplotlib.pyplot as plt
+import numpy
 from typing import Dict, Any
 
 
+COUNT_TYPE = numpy.int64
+
+
 class RecordCounter:
-    def __init__(self, class_list:list = None):
-        self.count_all = 0
-        if class_list:
-            self.count = {
-                cls: 0
-                for cls in class_list
-                }
+    def __init__(self, class_list:list = None, counts:numpy.ndarray = None):
+        # The class list may be shared by many counters, it is copied 
+        # before a new class is appended
+        self.class_list = class_list if class_list else []
+        self.class_index = None
+        if counts is None:
+            self.counts = numpy.zeros(len(self.class_list), dtype=COUNT_TYPE)
         else:
-            self.count = {}
-    
+            assert len(counts) == len(self.class_list)
+            self.counts = numpy.asarray(counts, dtype=COUNT_TYPE)
+
+    @classmethod
+    def from_counts(cls, class_list:list, counts:numpy.ndarray) \
+        -> 'RecordCounter':
+        return cls(class_list, counts)
+
+    @property
+    def count_all(self):
+        return int(self.counts.sum())
+
+    @property
+    def count(self) -> dict:
+        return dict(zip(self.class_list, self.counts.tolist()))
+
+    def get_class_index(self) -> dict:
+        if self.class_index is None:
+            self.class_index = {
+                cls: index
+                for index, cls in enumerate(self.class_list)
+                }
+        return self.class_index
+
     def record(self, cls, cnt=1):
         assert not (cls is None)
-        self.count_all += cnt
-        if cls in self.count:
-            self.count[cls] += cnt
-        else:
-            self.count[cls] = cnt
+        class_index = self.get_class_index()
+        index = class_index.get(cls)
+        if index is None:
+            index = len(self.class_list)
+            self.class_list = self.class_list + [cls]
+            self.class_index = None
+            self.counts = numpy.append(self.counts, 0)
+        self.counts[index] += cnt
 
     def get_most_frequent_class(self):
-        result = None
-        for cls in self.count:
-            if (result is None) or (self.count[cls] > self.count[result]):
-                result = cls
-        return result
+        if not self.class_list:
+            return None
+        return self.class_list[int(self.counts.argmax())]
 
     def get_max_frequency(self):
-        cls = self.get_most_frequent_class()
-        return self.count.get(cls, 0)
+        if not self.class_list:
+            return 0
+        return int(self.counts.max())
+
+    def aligned_counts(self, other:'RecordCounter') -> numpy.ndarray:
+        # Counts of other, in the class order of self
+        if other.class_list is self.class_list \
+            or other.class_list == self.class_list:
+            return other.counts
+        for cls in other.class_list:
+            if cls not in self.get_class_index():
+                self.record(cls, 0)
+        class_index = self.get_class_index()
+        counts = numpy.zeros(len(self.class_list), dtype=COUNT_TYPE)
+        for cls, cnt in zip(other.class_list, other.counts):
+            counts[class_index[cls]] = cnt
+        return counts
+
+    def copy(self) -> 'RecordCounter':
+        return RecordCounter(self.class_list, self.counts.copy())
+
+    def __iadd__(self, other:'RecordCounter') -> 'RecordCounter':
+        self.counts += self.aligned_counts(other)
+        return self
+
+    def __isub__(self, other:'RecordCounter') -> 'RecordCounter':
+        self.counts -= self.aligned_counts(other)
+        return self
 
     def __add__(self, other:'RecordCounter') -> 'RecordCounter':
-        result = RecordCounter()
-        result.count_all = self.count_all + other.count_all
-        result.count = {
-            cls: self.count[cls] + other.count[cls]
-            for cls in self.count
-            }
+        result = self.copy()
+        result += other
         return result
 
     def __sub__(self, other:'RecordCounter') -> 'RecordCounter':
-        result = RecordCounter()
-        result.count_all = self.count_all - other.count_all
-        result.count = {
-            cls: self.count[cls] - other.count[cls]
-            for cls in self.count
-            }
+        result = self.copy()
+        result -= other
         return result
 
 
+def class_histogram(
+    group_codes:numpy.ndarray, class_codes:numpy.ndarray, 
+    group_cnt:int, class_cnt:int, weights:numpy.ndarray=None
+    ) -> numpy.ndarray:
+    # Matrix (group_cnt x class_cnt) of item counts (or sums of weights)
+    flat_codes = group_codes.astype(numpy.intp) * class_cnt + class_codes
+    histogram = numpy.bincount(
+        flat_codes, weights=weights, minlength=group_cnt*class_cnt
+        )
+    return histogram.reshape(group_cnt, class_cnt)
+
+
+def count_histogram(
+    group_codes:numpy.ndarray, counts:numpy.ndarray, group_cnt:int
+    ) -> numpy.ndarray:
+    # Matrix (group_cnt x classes) of the summed class counts of the items
+    # (items x classes) of each group
+    histogram = numpy.zeros((group_cnt, counts.shape[1]))
+    for index in range(counts.shape[1]):
+        histogram[:, index] = numpy.bincount(
+            group_codes, weights=counts[:, index], minlength=group_cnt
+            )
+    return histogram
+
+
+def group_rows(
+    rows:numpy.ndarray, group_codes:numpy.ndarray, group_cnt:int
+    ) -> list:
+    # Row i goes to group group_codes[i]. Rows are stably sorted by group
+    # once, each group is a slice of the sorted rows
+    order = numpy.argsort(group_codes, kind='stable')
+    sorted_rows = rows[order]
+    bounds = numpy.zeros(group_cnt + 1, dtype=numpy.intp)
+    numpy.cumsum(
+        numpy.bincount(group_codes, minlength=group_cnt), out=bounds[1:]
+        )
+    return [
+        sorted_rows[bounds[group]:bounds[group+1]]
+        for group in range(group_cnt)
+        ]
+
+
+def prefix_split_counts(histogram:numpy.ndarray) -> numpy.ndarray:
+    # Histogram (values x classes) of sorted values to the class counts 
+    # (splits x 2 x classes) of every split between 2 consecutive values
+    left_counts = numpy.cumsum(histogram, axis=0)[:-1]
+    right_counts = histogram.sum(axis=0) - left_counts
+    return numpy.stack((left_counts, right_counts), axis=1)
+
+
+def batch_entropy(counts:numpy.ndarray) -> numpy.ndarray:
+    # Entropy of every count vector along the last axis, 0 for empty vectors
+    totals = counts.sum(axis=-1, keepdims=True)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        props = numpy.where(totals > 0, counts / totals, 0)
+        terms = numpy.where(props > 0, props*numpy.log2(props), 0)
+    return -terms.sum(axis=-1)
+
+
+def batch_information_gain(
+    value_counts:numpy.ndarray, child_counts:numpy.ndarray
+    ) -> numpy.ndarray:
+    # value_counts: classes, child_counts: partitions x childs x classes
+    value_counts = numpy.asarray(value_counts)
+    value_total = value_counts.sum()
+    if value_total == 0:
+        return numpy.zeros(child_counts.shape[0])
+    child_totals = child_counts.sum(axis=-1)
+    child_entropy = (child_totals*batch_entropy(child_counts)).sum(axis=-1)
+    return batch_entropy(value_counts) - child_entropy/value_total
+
+
+def batch_max_gain(
+    value_counts:numpy.ndarray, child_counts:numpy.ndarray
+    ) -> numpy.ndarray:
+    return child_counts.max(axis=-1).sum(axis=-1).astype(float)
+
+
 def entropy(value: RecordCounter) -> float:
     assert value.count_all != 0
-    result = 0
-    for cls in value.count:
-        prop = value.count[cls] / value.count_all
-        if prop == 0:
-            continue
-        result -= prop*math.log2(prop)
-    return result
+    return float(batch_entropy(value.counts))
 
 
 def information_gain(value: RecordCounter, child: Dict[Any, RecordCounter]) \
     -> float:
-    if value.count_all == 0:
+    value_total = value.count_all
+    if value_total == 0:
         return 0
     result = entropy(value)
     for c_val in child:
-        if child[c_val].count_all == 0:
+        child_total = child[c_val].count_all
+        if child_total == 0:
             continue
-        result -= child[c_val].count_all / value.count_all \
-            * entropy(child[c_val])
+        result -= child_total / value_total * entropy(child[c_val])
     return result
 
 
@@ -84,15 +201,36 @@ def max_gain(value: RecordCounter, child: Dict[Any, RecordCounter]) -> float:
     return result
 
 
-def exp_mechanism(edp:float, sensi:float, score:float) -> float:
+BATCH_UTILITY_FUNCTIONS = {
+    information_gain: batch_information_gain,
+    max_gain: batch_max_gain,
+    }
+
+
+def get_batch_utility(utility_function):
+    return BATCH_UTILITY_FUNCTIONS[utility_function]
+
+
+def log_exp_mechanism(edp:float, sensi:float, scores:numpy.ndarray) \
+    -> numpy.ndarray:
+    # Logarithm of the weights exp(edp/(2*sensi)*score), which never
+    # overflows
     assert sensi != 0
-    return math.exp(edp/(2*sensi)*score)
+    return edp/(2*sensi)*numpy.asarray(scores, dtype=float)
 
 
 def interval_to_str(from_value:float, to_value:float) -> str:
     return "[{0},{1})".format(from_value, to_value)
 
 
+def intervals_to_str(split_values:list) -> list:
+    # Labels of the intervals between consecutive sorted split values
+    return [
+        interval_to_str(from_value, to_value)
+        for from_value, to_value in zip(split_values, split_values[1:])
+        ]
+
+
 def scatter_plot(matrix):    
     if matrix.shape[1] == 3:
         fig = plt.figure()
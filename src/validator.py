@@ -1,13 +1,19 @@
+import numpy
+from concurrent.futures import ThreadPoolExecutor
+
 from settings import MISSING_VALUE, TAXO_FROM, TAXO_TO, TAXO_ROOT, \
-    TAXO_NODE_NAME, TAXO_NODE_CHILD, CLASS_ATTRIBUTE
-from src.exceptions import TaxoTreeMissingAttributeException, \
+    CLASS_ATTRIBUTE, VALIDATION_WORKERS
+from src.dataset import ColumnarDataset
+from src.exceptions import BaseException, TaxoTreeMissingAttributeException, \
     DatasetMissingAttributeException, DatasetAttributeMissingValueException, \
     TaxoTreeFloatAtttributeMissingRootException, TaxoNodeException, \
     TaxoTreeCategoryAttributeMissingRootException, TaxoTreeCoverageException, \
-    TaxoTreeFloatAtttributeRootException, TaxoNodeMissingKeyException
+    TaxoTreeFloatAtttributeRootException, TaxoNodeMissingKeyException, \
+    InputDataException
+from src.taxonomy import get_taxonomy_index
 
 
-PATH_SEP = "/"
+SAMPLE_ROW_CNT = 5  # Reported rows of each problem
 
 
 def check_float_attribute(dataset, attribute):
@@ -21,6 +27,11 @@ def check_float_attribute(dataset, attribute):
 
 
 def count_float_attribute(dataset):
+    if isinstance(dataset, ColumnarDataset):
+        return sum(
+            1 for attribute in dataset.get_attributes()
+            if dataset.is_float_attribute(attribute)
+            )
     res = 0
     for attribute in dataset[0]:
         if check_float_attribute(dataset, attribute):
@@ -28,78 +39,133 @@ def count_float_attribute(dataset):
     return res
 
 
-def get_all_leaf_values(node, trace_path):
-    if not isinstance(node, dict):
-        raise TaxoNodeException(trace_path)
-    if TAXO_NODE_NAME not in node:
-        raise TaxoNodeMissingKeyException(trace_path, TAXO_NODE_NAME)
-    if (TAXO_NODE_CHILD not in node) or \
-        (not isinstance(node[TAXO_NODE_CHILD], list)):
-        raise TaxoNodeMissingKeyException(trace_path, TAXO_NODE_CHILD)
-    new_trace_path = trace_path + node[TAXO_NODE_NAME] + PATH_SEP
-    result = []
-    if not node[TAXO_NODE_CHILD]:  # Is leaf node
-        result.append(node[TAXO_NODE_NAME])
-    else: 
-        for child_node in node[TAXO_NODE_CHILD]:
-            result.extend(get_all_leaf_values(child_node, new_trace_path))
-    return result
-
-
-def check_valid_input_data(taxo_tree, dataset):
+def with_rows(exception:BaseException, rows:numpy.ndarray) -> BaseException:
+    # Adds the number of bad rows and the first of them to the detail
+    exception.row_cnt = len(rows)
+    exception.rows = rows[:SAMPLE_ROW_CNT].tolist()
+    exception.detail += " ({cnt} rows, e.g. rows {rows})".format(
+        cnt=exception.row_cnt, rows=exception.rows
+        )
+    return exception
+
+
+def check_class_attribute(dataset:ColumnarDataset) -> list:
+    if CLASS_ATTRIBUTE not in dataset.get_attributes():
+        return [DatasetMissingAttributeException(CLASS_ATTRIBUTE)]
+    class_list = dataset.get_class_list()
+    empty_classes = numpy.array(
+        [not cls for cls in class_list], dtype=bool
+        )
+    empty_rows = numpy.flatnonzero(empty_classes[dataset.get_class_codes()])
+    if len(empty_rows):
+        return [with_rows(
+            DatasetMissingAttributeException(CLASS_ATTRIBUTE), empty_rows
+            )]
+    return []
+
+
+def check_float_column(attribute, column:numpy.ndarray, attribute_info) \
+    -> list:
+    # Check if there is TAXO_FROM and TAXO_TO
+    if (TAXO_FROM not in attribute_info) or (TAXO_TO not in attribute_info):
+        return [TaxoTreeFloatAtttributeMissingRootException(attribute)]
+    # Check if TAXO_FROM and TAXO_TO is valid
+    try:
+        att_from_value = float(attribute_info[TAXO_FROM])
+        att_to_value = float(attribute_info[TAXO_TO])
+    except (TypeError, ValueError):
+        return [TaxoTreeFloatAtttributeRootException(attribute)]
+    if att_from_value >= att_to_value:
+        return [TaxoTreeFloatAtttributeRootException(attribute)]
+    # Integrity, rows are only compared when the range of the column is
+    # not inside the range of the attribute. NaN values (missing rows are
+    # dropped on import) are never covered, min and max propagate them
+    if not len(column) or (
+        column.min() >= att_from_value and column.max() < att_to_value
+        ):
+        return []
+    bad_rows = numpy.flatnonzero(
+        ~((column >= att_from_value) & (column < att_to_value))
+        )
+    return [with_rows(
+        TaxoTreeCoverageException(attribute, column[bad_rows[0]].item()),
+        bad_rows
+        )]
+
+
+def check_category_column(
+    attribute, column:numpy.ndarray, categories:list, taxo_tree:dict
+    ) -> list:
+    # Syntax
+    if TAXO_ROOT not in taxo_tree[attribute]:
+        return [TaxoTreeCategoryAttributeMissingRootException(attribute)]
+    try:
+        leaf_values = get_taxonomy_index(taxo_tree, attribute).leaf_values
+    except (TaxoNodeException, TaxoNodeMissingKeyException) as e:
+        return [e]
+    # Integrity, checked once for each distinct value
+    category_arr = numpy.empty(len(categories), dtype=object)
+    category_arr[:] = categories
+    leaf_arr = numpy.empty(len(leaf_values), dtype=object)
+    leaf_arr[:] = leaf_values
+    bad_categories = ~numpy.isin(category_arr, leaf_arr) \
+        & (category_arr != MISSING_VALUE)
+    if not bad_categories.any():
+        return []
+    bad_rows = numpy.flatnonzero(bad_categories[column])
+    problems = []
+    for code in numpy.unique(column[bad_rows]).tolist():
+        problems.append(with_rows(
+            TaxoTreeCoverageException(attribute, categories[code]),
+            bad_rows[column[bad_rows] == code]
+            ))
+    return problems
+
+
+def check_attribute(taxo_tree:dict, dataset:ColumnarDataset, attribute) \
+    -> list:
+    if attribute not in taxo_tree:
+        return [TaxoTreeMissingAttributeException(attribute)]
+    column = dataset.get_column(attribute)
+    if dataset.is_float_attribute(attribute):
+        return check_float_column(attribute, column, taxo_tree[attribute])
+    return check_category_column(
+        attribute, column, dataset.get_categories(attribute), taxo_tree
+        )
+
+
+def check_valid_input_data(taxo_tree, dataset, workers:int=VALIDATION_WORKERS):
+    # Checked column by column (in a thread pool if workers > 1), all
+    # problems are reported together
     if len(dataset) < 1:
         return
-    # Check dataset
-    for item in dataset:
-        if not item.get(CLASS_ATTRIBUTE):
-            raise DatasetMissingAttributeException(CLASS_ATTRIBUTE)
-    # Check taxonomy tree
-    for attribute in dataset[0]:
-        if attribute == CLASS_ATTRIBUTE:
-            continue
-        if attribute not in taxo_tree:
-            raise TaxoTreeMissingAttributeException(attribute)
-        is_float_attribute = check_float_attribute(dataset, attribute)
-        attribute_info = taxo_tree[attribute]
-        if is_float_attribute:
-            # Check if there is TAXO_FROM and TAXO_TO
-            if (TAXO_FROM not in attribute_info) or \
-                (TAXO_TO not in attribute_info):
-                raise TaxoTreeFloatAtttributeMissingRootException(attribute)
-            # Check if TAXO_FROM and TAXO_TO is valid
-            try:
-                att_from_value = float(attribute_info[TAXO_FROM])
-                att_to_value = float(attribute_info[TAXO_TO])
-            except ValueError:
-                raise TaxoTreeFloatAtttributeRootException(attribute)
-            if att_from_value >= att_to_value:
-                raise TaxoTreeFloatAtttributeRootException(attribute)
-            # Integrity
-            for item in dataset:
-                item_att = item[attribute]
-                if item_att == MISSING_VALUE:
-                    continue
-                if not (item_att>=att_from_value and item_att<att_to_value):
-                    raise TaxoTreeCoverageException(attribute, item_att)
-        else:   # Category attribute
-            # Syntax
-            if TAXO_ROOT not in attribute_info:
-                raise TaxoTreeCategoryAttributeMissingRootException(attribute)
-            att_root = attribute_info[TAXO_ROOT]
-            trace_path = attribute + PATH_SEP
-            leaf_values = get_all_leaf_values(att_root, trace_path)
-            # Integrity
-            leaf_value_record = {
-                value: True
-                for value in leaf_values
-                }
-            for item in dataset:
-                item_att = item[attribute]
-                if item_att == MISSING_VALUE:
-                    continue
-                if not leaf_value_record.get(item_att):
-                    raise TaxoTreeCoverageException(attribute, item_att)
+    if not isinstance(dataset, ColumnarDataset):
+        dataset = ColumnarDataset.from_dicts(dataset)
+    problems = check_class_attribute(dataset)
+    attributes = [
+        attribute for attribute in dataset.get_attributes()
+        if attribute != CLASS_ATTRIBUTE
+        ]
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(
+                lambda attribute: check_attribute(
+                    taxo_tree, dataset, attribute
+                    ),
+                attributes
+                ))
+    else:
+        results = [
+            check_attribute(taxo_tree, dataset, attribute)
+            for attribute in attributes
+            ]
+    for result in results:
+        problems.extend(result)
+    if len(problems) == 1:
+        raise problems[0]
+    if problems:
+        raise InputDataException(problems)
     # Remove reduntdant part of taxonomy tree
-    redundant_atts = taxo_tree.keys() - dataset[0].keys()
+    redundant_atts = taxo_tree.keys() - set(dataset.get_attributes())
     for att in redundant_atts:
         taxo_tree.pop(att)
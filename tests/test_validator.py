@@ -0,0 +1,61 @@
+import numpy
+import unittest
+
+from settings import CLASS_ATTRIBUTE, TAXO_FROM, TAXO_TO, TAXO_ROOT, \
+    TAXO_NODE_NAME, TAXO_NODE_CHILD
+from src.dataset import ColumnarDataset
+from src.exceptions import TaxoTreeCoverageException, InputDataException
+from src.validator import check_valid_input_data
+
+
+def get_taxo_tree() -> dict:
+    return {
+        "age": {TAXO_FROM: 0, TAXO_TO: 100},
+        "sex": {TAXO_ROOT: {
+            TAXO_NODE_NAME: "Any",
+            TAXO_NODE_CHILD: [
+                {TAXO_NODE_NAME: "Male", TAXO_NODE_CHILD: []},
+                {TAXO_NODE_NAME: "Female", TAXO_NODE_CHILD: []},
+                ]
+            }},
+        }
+
+
+def get_dataset(ages:list, sexes:list) -> ColumnarDataset:
+    dataset = ColumnarDataset.from_columns({
+        "sex": sexes,
+        CLASS_ATTRIBUTE: ["yes"] * len(sexes),
+        })
+    dataset.columns["age"] = numpy.array(ages, dtype=float)
+    return dataset
+
+
+class CheckValidInputDataTest(unittest.TestCase):
+    def test_valid_data(self):
+        check_valid_input_data(
+            get_taxo_tree(), get_dataset([0.0, 99.5], ["Male", "Female"])
+            )
+
+    def test_nan_is_not_covered(self):
+        with self.assertRaises(TaxoTreeCoverageException) as context:
+            check_valid_input_data(
+                get_taxo_tree(),
+                get_dataset([20.0, numpy.nan, 30.0], ["Male"] * 3)
+                )
+        self.assertEqual(context.exception.row_cnt, 1)
+        self.assertEqual(context.exception.rows, [1])
+
+    def test_all_problems_are_reported(self):
+        with self.assertRaises(InputDataException) as context:
+            check_valid_input_data(
+                get_taxo_tree(),
+                get_dataset([numpy.nan, 100.0, 5.0], ["Male", "Male", "X"])
+                )
+        problems = context.exception.exceptions
+        self.assertEqual(
+            sorted(problem.rows for problem in problems), [[0, 1], [2]]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()